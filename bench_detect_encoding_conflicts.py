@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Reproducible benchmark for detect_encoding_conflicts: generate synthetic
+wildcard files and record parse / index build / query time, peak RSS and
+conflicts per second as JSON.
+"""
+import json
+import os
+import platform
+import random
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import detect_encoding_conflicts as dec
+
+DEFAULT_SIZES = "1000,10000,100000"
+# same field split as the OP-V fcov lines: funct6_vm_vs2_vs1_funct3_vd_opcode
+FIELDS = (6, 1, 5, 5, 3, 5, 7)
+
+
+def gen_synthetic(filename, n, density, conflict_rate, seed=0):
+    """
+    Write n wildcard patterns to filename.
+    Every pattern fixes the same K = bit_length(n - 1) key bits (random
+    positions) to a value unique to it, so patterns never overlap by
+    accident; each other bit is '?' with probability density. With
+    probability conflict_rate a pattern instead widens an earlier one (its
+    non-key bits turn to '?' with probability density), which guarantees
+    at least one overlap.
+    Return: number of planted conflicting patterns
+    """
+    rng = random.Random(seed)
+    k = max(1, (n - 1).bit_length())
+    key_pos = sorted(rng.sample(range(32), k))
+    keys = rng.sample(range(1 << k), n)
+
+    codes = []
+    planted = 0
+    with open(filename, "w") as f:
+        for i in range(n):
+            if codes and rng.random() < conflict_rate:
+                base = codes[rng.randrange(len(codes))]
+                code = [c if pos in key_pos or rng.random() >= density else '?'
+                        for pos, c in enumerate(base)]
+                planted += 1
+            else:
+                code = ['?' if rng.random() < density else rng.choice('01') for _ in range(32)]
+                key = format(keys[i], f"0{k}b")
+                for pos, c in zip(key_pos, key):
+                    code[pos] = c
+            codes.append(code)
+
+            chunks, pos = [], 0
+            for width in FIELDS:
+                chunks.append("".join(code[pos:pos + width]))
+                pos += width
+            f.write(f"wildcard syn_{i} = {{32'b{'_'.join(chunks)}}};\n")
+    return planted
+
+
+def run_case(filename, engine, mem_budget):
+    """Measure one file; run in a fresh process so peak RSS is its own."""
+    t0 = time.perf_counter()
+    patterns = dec.load_patterns(filename)
+    t1 = time.perf_counter()
+
+    codes = [p[2] for p in patterns]
+    t2 = time.perf_counter()
+    for code in codes:
+        dec.encode_mask(code)
+    t3 = time.perf_counter()
+
+    if engine == "trie":
+        index = dec.build_index(patterns)
+        t4 = time.perf_counter()
+        pairs = dec._find_pairs_trie(patterns, index)
+    else:
+        t4 = time.perf_counter()
+        pairs = dec.find_conflict_pairs(patterns, engine, mem_budget)
+    t5 = time.perf_counter()
+
+    query_s = t5 - t4
+    return {
+        "patterns": len(patterns),
+        "conflicts": len(pairs),
+        "parse_s": t1 - t0,
+        "encode_mask_s": t3 - t2,
+        "build_s": t4 - t3,
+        "query_s": query_s,
+        "conflicts_per_s": len(pairs) / query_s if query_s else None,
+        # ru_maxrss is KiB on Linux
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def run_bench(sizes, density, conflict_rate, engine="trie",
+              mem_budget=dec.DEFAULT_MEM_BUDGET, seed=0, workdir=None):
+    results = []
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        for n in sizes:
+            filename = os.path.join(tmp, f"syn_{n}_fcov.sv")
+            planted = gen_synthetic(filename, n, density, conflict_rate, seed)
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                case = pool.submit(run_case, filename, engine, mem_budget).result()
+            case.update(n=n, planted=planted, file_bytes=os.path.getsize(filename))
+            results.append(case)
+            print(f"n={n}: parse {case['parse_s']:.3f}s, build {case['build_s']:.3f}s, "
+                  f"query {case['query_s']:.3f}s, {case['conflicts']} conflicts, "
+                  f"peak {case['peak_rss_kb'] >> 10} MiB")
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "engine": engine,
+            "density": density,
+            "conflict_rate": conflict_rate,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark detect_encoding_conflicts")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help="comma separated pattern counts (default: %(default)s)")
+    parser.add_argument("--density", type=float, default=0.3,
+                        help="probability of '?' on a non-key bit (default: %(default)s)")
+    parser.add_argument("--conflict-rate", type=float, default=0.01,
+                        help="fraction of patterns planted as overlaps (default: %(default)s)")
+    parser.add_argument("--engine", choices=dec.ENGINES, default="trie")
+    parser.add_argument("--mem-budget", type=int, default=dec.DEFAULT_MEM_BUDGET >> 20,
+                        help="MiB per tile for --engine numpy (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=None, help="where synthetic files are written")
+    parser.add_argument("-o", "--output", default="bench_detect_encoding_conflicts.json")
+    args = parser.parse_args()
+
+    sizes = [int(x) for x in args.sizes.split(",")]
+    report = run_bench(sizes, args.density, args.conflict_rate, args.engine,
+                       args.mem_budget << 20, args.seed, args.workdir)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"generated: {args.output}")
@@ -1,6 +1,34 @@
 #!/usr/bin/env python3
 # coding: utf-8
+import hashlib
+import math
+import mmap
+import os
+import pickle
 import re
+from concurrent.futures import ProcessPoolExecutor
+
+import stage_metrics
+from stage_metrics import stage as _stage
+
+FULL_MASK = 0xFFFFFFFF
+# max patterns kept in one trie leaf before it is split on another bit
+INDEX_LEAF_SIZE = 8
+# max patterns sampled when choosing the split bit of a trie node
+INDEX_SAMPLE_SIZE = 1024
+# bytes of temporaries the numpy engine may hold for one tile of the matrix
+DEFAULT_MEM_BUDGET = 64 << 20
+ENGINES = ("trie", "numpy")
+# files picked up when a directory is given
+FCOV_SUFFIX = "_fcov.sv"
+INDEX_DB_VERSION = 1
+# opcode[6:0] + funct3[14:12]: fixed in every gen_single_inst_code output
+DEFAULT_SHARD_MASK = 0x0000707F
+# below this many patterns the process pool costs more than it saves
+PARALLEL_MIN_PATTERNS = 20000
+
+_ENCODING_RE = re.compile(rb"\{32'b([^}\n]+)\}")
+_CODE_RE = re.compile(rb"[01_?]+")
 
 
 def parse_encoding(line, lineno):
@@ -38,60 +66,595 @@ def conflict_mask_mask(m1_val, m1_bits, m2_val, m2_bits):
     return (m1_val & m2_bits) == (m2_val & m1_bits)
 
 
-def detect_conflicts(filename):
+def format_cube(val, bits):
+    """(val, bits) -> 32 char '01?' string"""
+    return "".join(c if m == '1' else '?'
+                   for c, m in zip(format(val, "032b"), format(bits, "032b")))
+
+
+def cube_size(bits):
+    """Number of 32-bit words covered by a cube with fixed bits `bits`."""
+    return 1 << (32 - bin(bits & FULL_MASK).count("1"))
+
+
+def overlap_cube(code1, code2):
     """
-    Return: list of conflict pairs:
-    [ ((code1, line1), (code2, line2)), ... ]
+    Return: (cube, size) of the intersection of two conflicting codes
+    cube: '01?' string of the overlap, size: number of words it covers
+    The two fixed-bit sets agree wherever both are fixed, so the overlap is
+    fixed on their union and takes its value from either side.
+    """
+    v1, m1 = encode_mask(code1)
+    v2, m2 = encode_mask(code2)
+    bits = m1 | m2
+    return format_cube(v1 | v2, bits), cube_size(bits)
+
+
+def add_overlap(conflicts, sort_by_size=False):
     """
-    full_codes = {}  # val -> (code, lineno)
-    masks = []       # (val, bits, code, lineno)
-    duplicates = []
+    Return: [ ((code1, where1), (code2, where2), (cube, size)), ... ]
+    sort_by_size: largest overlap first (ties keep the input order)
+    """
+    report = [(a, b, overlap_cube(a[0], b[0])) for a, b in conflicts]
+    if sort_by_size:
+        report.sort(key=lambda r: r[2][1], reverse=True)
+    return report
+
 
+def load_patterns(filename):
+    """
+    Return: list of patterns in file order:
+    [ (val, bits, code, lineno), ... ]
+    Fully specified codes are plain patterns with bits == FULL_MASK.
+    """
+    patterns = []
     with open(filename, "r") as f:
         for idx, line in enumerate(f, 1):
             code = parse_encoding(line, idx)
             if not code:
                 continue
+            val, bits = encode_mask(code)
+            patterns.append((val, bits, code, idx))
+    return patterns
 
-            if '?' not in code:
-                val = int(code, 2)
-                if val in full_codes:
-                    duplicates.append(((code, idx), full_codes[val]))
-                else:
-                    full_codes[val] = (code, idx)
-            else:
-                m_val, m_bits = encode_mask(code)
-                masks.append((m_val, m_bits, code, idx))
 
-    # mask ↔ full
-    for m_val, m_bits, m_code, m_lineno in masks:
-        for f_val, (f_code, f_lineno) in full_codes.items():
-            if (f_val & m_bits) == m_val:
-                duplicates.append(((m_code, m_lineno), (f_code, f_lineno)))
+def scan_file(filename):
+    """
+    Memory-map filename and extract every {32'b...} literal in one regex pass.
+    Return: [ (val, bits, code, (filename, lineno)), ... ]
+    """
+    patterns = []
+    with open(filename, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return patterns
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            lineno, pos = 1, 0
+            for m in _ENCODING_RE.finditer(mm):
+                lineno += mm[pos:m.start()].count(b"\n")
+                pos = m.start()
+
+                raw = m.group(1)
+                if not _CODE_RE.fullmatch(raw):
+                    raise ValueError(f"[{filename}:{lineno}] Invalid characters: {raw.decode(errors='replace')}")
+                code = raw.replace(b"_", b"").decode()
+                if len(code) != 32:
+                    raise ValueError(f"[{filename}:{lineno}] Length != 32 bits: {code}")
+
+                val, bits = encode_mask(code)
+                patterns.append((val, bits, code, (filename, lineno)))
+    return patterns
+
+
+def collect_files(paths):
+    """
+    Expand directories into their *_fcov.sv files (recursive, sorted);
+    plain files are kept as given.
+    """
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        found = []
+        for root, _, names in os.walk(path):
+            found.extend(os.path.join(root, n) for n in names if n.endswith(FCOV_SUFFIX))
+        files.extend(sorted(found))
+    return files
+
+
+def scan_files(files, jobs=None):
+    """
+    Scan files in parallel, one worker process per file at a time.
+    Return: patterns of all files, in the order of files
+    """
+    if jobs == 1 or len(files) < 2:
+        results = map(scan_file, files)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=stage_metrics.stop) as pool:
+            results = list(pool.map(scan_file, files))
+
+    patterns = []
+    for file_patterns in results:
+        patterns.extend(file_patterns)
+    return patterns
+
+
+def _pick_split_bit(patterns, idxs, free_bits):
+    """
+    Pick the free bit that best separates idxs into fixed-0 / fixed-1.
+    Return 0 when no bit separates them.
+    """
+    step = max(1, len(idxs) // INDEX_SAMPLE_SIZE)
+    # transpose the '01?' strings: column k holds bit (31 - k) of every sample
+    columns = zip(*(patterns[i][2] for i in idxs[::step]))
+
+    best_bit, best_score = 0, (0, 0)
+    for k, col in enumerate(columns):
+        bit = 1 << (31 - k)
+        if not free_bits & bit:
+            continue
+        zeros = col.count('0')
+        ones = col.count('1')
+        score = (min(zeros, ones), zeros + ones)
+        if score[0] and score > best_score:
+            best_bit, best_score = bit, score
+    return best_bit
+
+
+def _build_node(patterns, idxs, free_bits, leaf_size):
+    if len(idxs) <= leaf_size:
+        return idxs
+    bit = _pick_split_bit(patterns, idxs, free_bits)
+    if not bit:
+        return idxs
+
+    zero, one, any_ = [], [], []
+    for i in idxs:
+        val, bits = patterns[i][0], patterns[i][1]
+        if not bits & bit:
+            any_.append(i)
+        elif val & bit:
+            one.append(i)
+        else:
+            zero.append(i)
+
+    free_bits &= ~bit
+    return (bit,
+            _build_node(patterns, zero, free_bits, leaf_size),
+            _build_node(patterns, one, free_bits, leaf_size),
+            _build_node(patterns, any_, free_bits, leaf_size))
+
+
+def build_index(patterns, leaf_size=INDEX_LEAF_SIZE):
+    """
+    Build a ternary bit-trie over patterns [(val, bits, code, ...), ...].
+    Inner node: (bit, fixed_0_child, fixed_1_child, dont_care_child)
+    Leaf:       [pattern index, ...]
+    """
+    return _build_node(patterns, list(range(len(patterns))), FULL_MASK, leaf_size)
+
+
+def query_index(index, patterns, val, bits):
+    """
+    Yield index of every pattern in the trie that intersects cube (val, bits).
+    Only subtrees whose split bit agrees with the cube are visited.
+    """
+    stack = [index]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            for i in node:
+                p = patterns[i]
+                if (val & p[1]) == (p[0] & bits):
+                    yield i
+            continue
+
+        bit, zero, one, any_ = node
+        stack.append(any_)
+        if bits & bit:
+            stack.append(one if val & bit else zero)
+        else:
+            stack.append(zero)
+            stack.append(one)
+
+
+def _leaf_of(index, val, bits):
+    """Return the one leaf a pattern (val, bits) is stored in."""
+    node = index
+    while not isinstance(node, list):
+        bit, zero, one, any_ = node
+        if bits & bit:
+            node = one if val & bit else zero
+        else:
+            node = any_
+    return node
+
+
+def index_insert(index, patterns, i):
+    p = patterns[i]
+    _leaf_of(index, p[0], p[1]).append(i)
+
+
+def index_remove(index, patterns, i):
+    p = patterns[i]
+    _leaf_of(index, p[0], p[1]).remove(i)
+
+
+def _find_pairs_trie(patterns, index=None):
+    if index is None:
+        with _stage("index_build") as st:
+            index = build_index(patterns)
+            st["rows"] = len(patterns)
+    pairs = []
+    with _stage("index_query") as st:
+        for i, p in enumerate(patterns):
+            for j in query_index(index, patterns, p[0], p[1]):
+                if j > i:
+                    pairs.append((i, j))
+        st["rows"] = len(patterns)
+    return pairs
+
+
+def _find_pairs_numpy(patterns, mem_budget=DEFAULT_MEM_BUDGET):
+    """
+    Evaluate (v1 & m2) == (v2 & m1) over the upper triangle of the n x n
+    matrix in square tiles; a tile costs ~12 bytes per cell (two uint32
+    temporaries plus the bool result), so its side is sqrt(mem_budget / 12).
+    """
+    import numpy as np
 
-    # mask ↔ mask
-    for i in range(len(masks)):
-        for j in range(i + 1, len(masks)):
-            mv1, mb1, c1, l1 = masks[i]
-            mv2, mb2, c2, l2 = masks[j]
-            if conflict_mask_mask(mv1, mb1, mv2, mb2):
-                duplicates.append(((c1, l1), (c2, l2)))
+    n = len(patterns)
+    vals = np.fromiter((p[0] for p in patterns), dtype=np.uint32, count=n)
+    bits = np.fromiter((p[1] for p in patterns), dtype=np.uint32, count=n)
+    tile = max(1, math.isqrt(mem_budget // 12))
 
-    return duplicates
+    pairs = []
+    with _stage("numpy_tiles") as st:
+        for a in range(0, n, tile):
+            va = vals[a:a + tile, None]
+            ba = bits[a:a + tile, None]
+            for b in range(a, n, tile):
+                vb = vals[None, b:b + tile]
+                bb = bits[None, b:b + tile]
+                ii, jj = np.nonzero((va & bb) == (vb & ba))
+                ii += a
+                jj += b
+                keep = ii < jj
+                pairs.extend(zip(ii[keep].tolist(), jj[keep].tolist()))
+        st["rows"] = n
+    return pairs
+
+
+def _find_pairs(patterns, engine, mem_budget):
+    if engine == "trie":
+        return _find_pairs_trie(patterns)
+    if engine == "numpy":
+        return _find_pairs_numpy(patterns, mem_budget)
+    raise ValueError(f"Unknown engine: {engine}")
+
+
+def _shard_worker(shards, engine, mem_budget):
+    """shards: [ [(global index, pattern), ...], ... ] -> global index pairs"""
+    pairs = []
+    for shard in shards:
+        ids = [i for i, _ in shard]
+        local = [p for _, p in shard]
+        pairs.extend((ids[i], ids[j]) for i, j in _find_pairs(local, engine, mem_budget))
+    return pairs
+
+
+def _find_pairs_sharded(patterns, engine, mem_budget, jobs, shard_mask):
+    """
+    Patterns whose shard_mask bits are all fixed can only meet patterns with
+    the same value there, so each such shard is checked on its own in a worker
+    process. The rest ("wild", with a don't-care under shard_mask) is indexed
+    separately and every pattern is queried against it in this process.
+    """
+    shards = {}
+    wild = []
+    for i, p in enumerate(patterns):
+        if p[1] & shard_mask == shard_mask:
+            shards.setdefault(p[0] & shard_mask, []).append((i, p[:3]))
+        else:
+            wild.append(i)
+
+    # pack shards into ~4 tasks per worker, heaviest (pairwise cost) first
+    jobs = jobs or os.cpu_count()
+    tasks = [[] for _ in range(min(len(shards), jobs * 4))]
+    cost = [0] * len(tasks)
+    for shard in sorted(shards.values(), key=len, reverse=True):
+        t = cost.index(min(cost))
+        tasks[t].append(shard)
+        cost[t] += len(shard) ** 2
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=stage_metrics.stop) as pool:
+        futures = [pool.submit(_shard_worker, t, engine, mem_budget) for t in tasks]
+
+        pairs = []
+        with _stage("wild_query") as st:
+            wild_patterns = [patterns[i] for i in wild]
+            wild_index = build_index(wild_patterns)
+            for i, p in enumerate(patterns):
+                for k in query_index(wild_index, wild_patterns, p[0], p[1]):
+                    j = wild[k]
+                    if j == i or (j < i and p[1] & shard_mask != shard_mask):
+                        continue  # self, or wild-wild pair already seen from j
+                    pairs.append((min(i, j), max(i, j)))
+            st["rows"] = len(wild)
+
+        with _stage("shard_wait") as st:
+            for f in futures:
+                pairs.extend(f.result())
+            st["rows"] = len(patterns) - len(wild)
+    return pairs
+
+
+def find_conflict_pairs(patterns, engine="trie", mem_budget=DEFAULT_MEM_BUDGET,
+                        jobs=1, shard_mask=DEFAULT_SHARD_MASK):
+    """
+    Return: sorted list of index pairs (i, j), i < j, whose patterns intersect
+    engine: "trie"  - ternary bit-trie, cost follows the number of overlaps
+            "numpy" - blocked broadcast of the full pairwise test, each tile
+                      bounded by mem_budget bytes (needs numpy)
+    jobs:   worker processes (None: all cores); with more than one, large
+            inputs are sharded on the shard_mask bits and checked in parallel
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine: {engine}")
+    with _stage("conflict_check") as st:
+        if jobs != 1 and len(patterns) >= PARALLEL_MIN_PATTERNS:
+            pairs = _find_pairs_sharded(patterns, engine, mem_budget, jobs, shard_mask)
+        else:
+            pairs = _find_pairs(patterns, engine, mem_budget)
+        pairs.sort()
+        st["rows"] = len(patterns)
+    return pairs
+
+
+def detect_conflicts(filename, engine="trie", mem_budget=DEFAULT_MEM_BUDGET,
+                     jobs=1, shard_mask=DEFAULT_SHARD_MASK):
+    """
+    Return: list of conflict pairs:
+    [ ((code1, line1), (code2, line2)), ... ]
+    line1 < line2, ordered by line1 then line2
+    """
+    with _stage("parse") as st:
+        patterns = load_patterns(filename)
+        st["rows"] = len(patterns)
+    return [((patterns[i][2], patterns[i][3]), (patterns[j][2], patterns[j][3]))
+            for i, j in find_conflict_pairs(patterns, engine, mem_budget, jobs, shard_mask)]
+
+
+def detect_conflicts_multi(paths, engine="trie", mem_budget=DEFAULT_MEM_BUDGET,
+                           jobs=None, shard_mask=DEFAULT_SHARD_MASK):
+    """
+    Check files and directories (their *_fcov.sv) against each other in one
+    indexed pass; conflicts inside a file and across files are both reported.
+    Return: list of conflict pairs:
+    [ ((code1, (file1, line1)), (code2, (file2, line2))), ... ]
+    """
+    with _stage("parse") as st:
+        patterns = scan_files(collect_files(paths), jobs)
+        st["rows"] = len(patterns)
+    return [((patterns[i][2], patterns[i][3]), (patterns[j][2], patterns[j][3]))
+            for i, j in find_conflict_pairs(patterns, engine, mem_budget, jobs, shard_mask)]
+
+
+def _file_digest(filename):
+    h = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_index_db(db_path):
+    """
+    Load the accepted-pattern index written by save_index_db, or an empty one.
+    {
+        "version":  INDEX_DB_VERSION,
+        "files":    {path: (sha256, [pattern index, ...])},
+        "patterns": [ (val, bits, code, (path, lineno)) or None, ... ],
+        "index":    bit-trie over the live patterns,
+        "dirty":    inserts / removals since the trie was last rebuilt,
+    }
+    """
+    if os.path.exists(db_path):
+        with open(db_path, "rb") as f:
+            db = pickle.load(f)
+        if db.get("version") == INDEX_DB_VERSION:
+            return db
+    return {"version": INDEX_DB_VERSION, "files": {}, "patterns": [], "index": [], "dirty": 0}
+
+
+def _index_db_stale(db):
+    """
+    True once enough patterns were inserted / removed in place, or while the
+    trie is still one oversized leaf (a fresh db), to warrant a rebuild.
+    """
+    index = db["index"]
+    if isinstance(index, list) and len(index) > INDEX_LEAF_SIZE:
+        return True
+    return db["dirty"] > max(1024, len(db["patterns"]) // 4)
+
+
+def rebuild_index_db(db):
+    """Drop the removed slots and rebuild the trie over the live patterns."""
+    remap = {}
+    live = []
+    for i, p in enumerate(db["patterns"]):
+        if p is not None:
+            remap[i] = len(live)
+            live.append(p)
+    db["files"] = {path: (digest, [remap[i] for i in idxs])
+                   for path, (digest, idxs) in db["files"].items()}
+    db["patterns"] = live
+    db["index"] = build_index(live)
+    db["dirty"] = 0
+
+
+def save_index_db(db, db_path):
+    """
+    Write db atomically, rebuilding the trie first if it went stale, so it
+    stays balanced.
+    """
+    if _index_db_stale(db):
+        rebuild_index_db(db)
+
+    tmp = db_path + ".tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(db, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, db_path)
+
+
+def detect_conflicts_incremental(paths, db_path, jobs=None, engine="trie",
+                                 mem_budget=DEFAULT_MEM_BUDGET, shard_mask=DEFAULT_SHARD_MASK):
+    """
+    Like detect_conflicts_multi, but only patterns that are new since the
+    index at db_path was saved are checked, against the stored index and
+    against each other. Files whose sha256 is unchanged are not even read.
+    New patterns are checked against each other with find_conflict_pairs
+    (engine, mem_budget, jobs and shard_mask are passed through), so a cold
+    run costs the same as detect_conflicts_multi.
+    The index is updated only when no conflict is found, so it always holds
+    accepted patterns; a large batch of additions rebuilds the trie.
+    Return: list of conflict pairs (accepted or earlier new pattern first):
+    [ ((code1, (file1, line1)), (code2, (file2, line2))), ... ]
+    """
+    db = load_index_db(db_path)
+    files, patterns, index = db["files"], db["patterns"], db["index"]
+
+    with _stage("hash_files") as st:
+        current = {os.path.normpath(f): None for f in collect_files(paths)}
+        for path in current:
+            current[path] = _file_digest(path)
+        st["rows"] = len(current)
+    changed = [path for path, digest in current.items()
+               if path not in files or files[path][0] != digest]
+    removed = [path for path in files if path not in current]
+
+    # match re-scanned patterns to stored ones by code; leftovers are removed
+    with _stage("parse") as st:
+        scanned = scan_files(changed, jobs)
+        st["rows"] = len(scanned)
+    old_by_code = {}
+    for path in changed + removed:
+        for i in files.get(path, (None, []))[1]:
+            old_by_code.setdefault((path, patterns[i][2]), []).append(i)
+
+    new_files = {path: (current[path], []) for path in changed}
+    added = []
+    for p in scanned:
+        path = p[3][0]
+        stored = old_by_code.get((path, p[2]))
+        if stored:
+            i = stored.pop()
+            patterns[i] = p
+            new_files[path][1].append(i)
+        else:
+            added.append(p)
+
+    for stale in old_by_code.values():
+        for i in stale:
+            index_remove(index, patterns, i)
+            patterns[i] = None
+            db["dirty"] += 1
+
+    conflicts = []
+    with _stage("index_query") as st:
+        for p in added:
+            for j in query_index(index, patterns, p[0], p[1]):
+                conflicts.append(((patterns[j][2], patterns[j][3]), (p[2], p[3])))
+        st["rows"] = len(added)
+    for a, b in find_conflict_pairs(added, engine, mem_budget, jobs, shard_mask):
+        conflicts.append(((added[a][2], added[a][3]), (added[b][2], added[b][3])))
+
+    if not conflicts:
+        for p in added:
+            new_files[p[3][0]][1].append(len(patterns))
+            patterns.append(p)
+        db["dirty"] += len(added)
+        for path in removed:
+            del files[path]
+        files.update(new_files)
+        if _index_db_stale(db):
+            with _stage("index_build") as st:
+                rebuild_index_db(db)
+                st["rows"] = len(db["patterns"])
+        else:
+            for i in range(len(patterns) - len(added), len(patterns)):
+                index_insert(index, patterns, i)
+        with _stage("save_index") as st:
+            save_index_db(db, db_path)
+            st["rows"] = len(db["patterns"])
+    return conflicts
 
 
 # Optional CLI wrapper (still usable)
 if __name__ == "__main__":
-    import sys
-    if len(sys.argv) < 2:
-        print(f"Usage: {sys.argv[0]} input_file")
-        sys.exit(1)
+    import argparse
 
-    conflicts = detect_conflicts(sys.argv[1])
+    parser = argparse.ArgumentParser(description="Detect overlapping {32'b...} encodings")
+    parser.add_argument("inputs", nargs="+", metavar="input",
+                        help="fcov file; several files or directories of *_fcov.sv "
+                             "are checked against each other")
+    parser.add_argument("--engine", choices=ENGINES, default="trie",
+                        help="conflict search engine (default: trie)")
+    parser.add_argument("--mem-budget", type=int, default=DEFAULT_MEM_BUDGET >> 20,
+                        help="MiB per tile for --engine numpy (default: %(default)s)")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="worker processes for scanning files and, on large inputs, "
+                             "for sharded conflict checking (default: all cores)")
+    parser.add_argument("--shard-mask", type=lambda x: int(x, 0), default=DEFAULT_SHARD_MASK,
+                        help="fixed bits patterns are sharded on (default: %(default)#010x, "
+                             "opcode + funct3)")
+    parser.add_argument("--index-db", metavar="PATH",
+                        help="incremental mode: only check patterns added since the "
+                             "accepted-pattern index in PATH (a local pickle) was saved")
+    parser.add_argument("--sort", choices=("line", "overlap"), default="line",
+                        help="report order: by line, or largest overlap first")
+    parser.add_argument("--metrics", metavar="OUT_JSON",
+                        help="write per-stage wall / CPU time, traced memory peak and "
+                             "row counts as JSON (enables tracemalloc, which slows the run)")
+    parser.add_argument("--profile", metavar="OUT_PROF",
+                        help="run under cProfile and dump the stats to OUT_PROF")
+    args = parser.parse_args()
 
-    if conflicts:
-        print("========= Found Conflicts =========")
-        for (c1, l1), (c2, l2) in conflicts:
-            print(f"[Line {l1}] {c1}  <==>  [Line {l2}] {c2}\n")
-    else:
-        print("No conflicts found.")
+    if args.metrics:
+        stage_metrics.start()
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    mem_budget = args.mem_budget << 20
+    multi = args.index_db or len(args.inputs) > 1 or os.path.isdir(args.inputs[0])
+    try:
+        if args.index_db:
+            conflicts = detect_conflicts_incremental(args.inputs, args.index_db, args.jobs,
+                                                     args.engine, mem_budget, args.shard_mask)
+        elif multi:
+            conflicts = detect_conflicts_multi(args.inputs, args.engine, mem_budget,
+                                               args.jobs, args.shard_mask)
+        else:
+            conflicts = detect_conflicts(args.inputs[0], args.engine, mem_budget,
+                                         args.jobs, args.shard_mask)
+
+        with _stage("report") as st:
+            if conflicts:
+                print("========= Found Conflicts =========")
+                for (c1, l1), (c2, l2), (cube, size) in add_overlap(conflicts, args.sort == "overlap"):
+                    if multi:
+                        print(f"[{l1[0]}:{l1[1]}] {c1}  <==>  [{l2[0]}:{l2[1]}] {c2}")
+                    else:
+                        print(f"[Line {l1}] {c1}  <==>  [Line {l2}] {c2}")
+                    print(f"    overlap: {cube}  ({size} words)\n")
+            else:
+                print("No conflicts found.")
+            st["rows"] = len(conflicts)
+    finally:
+        if args.profile:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+        if args.metrics:
+            stage_metrics.METRICS.save(args.metrics)
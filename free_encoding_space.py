@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+List the encoding space inside one major opcode that no {32'b...} pattern
+covers, as merged disjoint '01?' cubes. Only cube algebra (cofactor split,
+sharp, merge) is used; no instruction word is ever enumerated.
+The cube list is disjoint and merged, but not guaranteed to be minimal.
+"""
+from detect_encoding_conflicts import FULL_MASK, collect_files, cube_size, format_cube, scan_files
+
+OPCODE_MASK = 0x7F
+OP_V = 0x57
+
+
+def cube_sharp(cube, pattern):
+    """
+    Return: disjoint cubes covering cube minus pattern ("sharp" product)
+    Both are (val, bits) pairs.
+    """
+    cv, cm = cube
+    pv, pm = pattern
+    if (cv ^ pv) & cm & pm:
+        return [cube]  # disjoint, nothing to remove
+
+    out = []
+    split = pm & ~cm
+    while split:
+        bit = 1 << (split.bit_length() - 1)  # MSB first
+        split &= ~bit
+        out.append((cv | (~pv & bit), cm | bit))
+        cv |= pv & bit
+        cm |= bit
+    return out
+
+
+def merge_cubes(cubes):
+    """
+    Merge adjacent cubes (same fixed bits, values differing in exactly one
+    of them) until no pair is left. Disjoint input stays disjoint.
+    """
+    by_bits = {}
+    for val, bits in cubes:
+        by_bits.setdefault(bits, set()).add(val)
+
+    pending = list(by_bits)
+    while pending:
+        bits = pending.pop()
+        vals = by_bits.get(bits)
+        if not vals:
+            continue
+        b = bits
+        while b:
+            bit = b & -b
+            b &= ~bit
+            pairs = [v for v in vals if not v & bit and v | bit in vals]
+            if not pairs:
+                continue
+            merged = by_bits.setdefault(bits & ~bit, set())
+            for v in pairs:
+                vals.discard(v)
+                vals.discard(v | bit)
+                merged.add(v)
+            pending.append(bits & ~bit)
+        if not vals:
+            del by_bits[bits]
+
+    return [(val, bits) for bits, vals in by_bits.items() for val in vals]
+
+
+def _split_bit(patterns, free_bits, lsb_first=False):
+    """
+    A free bit of the universe, preferring one fixed in every pattern
+    (the most or, with lsb_first, the least significant of those).
+    """
+    common = free_bits
+    for _, pm in patterns:
+        common &= pm
+    if common:
+        return common & -common if lsb_first else 1 << (common.bit_length() - 1)
+
+    best_bit, best_count = 0, 0
+    b = free_bits
+    while b:
+        bit = b & -b
+        b &= ~bit
+        count = sum(1 for _, pm in patterns if pm & bit)
+        if count > best_count:
+            best_bit, best_count = bit, count
+    return best_bit
+
+
+def _complement(universe, patterns, lsb_first=False):
+    """
+    Cubes covering universe minus the union of patterns; every pattern must
+    intersect universe. Split universe on one bit until a single pattern
+    is left, then subtract it with cube_sharp.
+    """
+    uv, um = universe
+    if not patterns:
+        return [universe]
+    for _, pm in patterns:
+        if not pm & ~um:
+            return []  # pattern contains the whole universe
+    if len(patterns) == 1:
+        return cube_sharp(universe, patterns[0])
+
+    bit = _split_bit(patterns, ~um & FULL_MASK, lsb_first)
+    free = []
+    for half in (0, bit):
+        sub = [(pv, pm) for pv, pm in patterns if not pm & bit or pv & bit == half]
+        free.extend(_complement((uv | half, um | bit), sub, lsb_first))
+    return free
+
+
+def free_space(patterns, opcode=OP_V, opcode_mask=OPCODE_MASK):
+    """
+    patterns: [ (val, bits, ...), ... ]
+    Return: free cubes [(val, bits), ...] inside the major opcode, largest first
+
+    The cubes are disjoint and no two of them can be merged into one, but
+    the list is not guaranteed to be minimal: the result depends on the
+    order the space is split in. Both split orders (most / least significant
+    common bit first) are tried and the shorter list is kept.
+    """
+    universe = (opcode & opcode_mask, opcode_mask)
+    inside = [(p[0], p[1]) for p in patterns
+              if not (p[0] ^ universe[0]) & p[1] & opcode_mask]
+
+    free = min((merge_cubes(_complement(universe, inside, lsb_first))
+                for lsb_first in (False, True)), key=len)
+    free.sort(key=lambda c: (-cube_size(c[1]), c[0]))
+    return free
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="List unallocated encoding space in a major opcode")
+    parser.add_argument("inputs", nargs="+", metavar="input",
+                        help="fcov files or directories of *_fcov.sv")
+    parser.add_argument("--opcode", type=lambda x: int(x, 0), default=OP_V,
+                        help="major opcode, bits [6:0] (default: %(default)#04x, OP-V)")
+    parser.add_argument("--limit", type=int, default=None, help="print only the N largest cubes")
+    args = parser.parse_args()
+
+    patterns = scan_files(collect_files(args.inputs))
+    free = free_space(patterns, args.opcode)
+
+    total = cube_size(OPCODE_MASK)
+    free_words = sum(cube_size(bits) for _, bits in free)
+    print(f"opcode {args.opcode:#04x}: {len(free)} free cubes, "
+          f"{free_words} / {total} words free ({100.0 * free_words / total:.2f}%)")
+    for val, bits in free[:args.limit]:
+        print(f"{format_cube(val, bits)}  {cube_size(bits)}")
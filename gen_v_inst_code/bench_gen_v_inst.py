@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""
+gen_v_inst.py 端到端基准：把真实的 funct6_funct3.adoc / vs1_vs2.adoc 放大 N 倍，
+对每个规模完整运行 run_pipeline，记录各阶段吞吐量（行/秒）和峰值 RSS（JSON）；
+给出 --baseline 时与基线比较，有阶段退化超过阈值则以非 0 退出
+"""
+import os
+import re
+import sys
+import json
+import shutil
+import platform
+import tempfile
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import gen_v_inst
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SCALES = "10,100,1000"
+# 相对基线允许的退化比例（吞吐量下降 / 峰值内存增长）
+DEFAULT_THRESHOLD = 0.25
+# 基线中 CPU 时间不足该值的阶段计时噪声太大，不参与比较
+MIN_STAGE_SECONDS = 0.5
+# 只比较叶子阶段：stage:* 是整个 DAG 阶段的外壳（含 import_pandas 等一次性开销）
+WRAPPER_STAGE_PREFIX = "stage:"
+
+# funct6_funct3.adoc 按 "|" 切开后，三组助记符所在的列
+FUNCT6_FUNCT3_MNEMONIC_COLS = (5, 9, 13)
+
+def _suffix(copy):# {{{
+    """第 0 份保持原名，其余加 x<copy>（不能含 "_"，build_opcode_map 按 "_" 取类型前缀）"""
+    return f"x{copy}" if copy else ""# }}}
+
+def scale_funct6_funct3(input_file, output_file, scale):# {{{
+    """把 funct6_funct3.adoc 的表格复制 scale 份，每份的助记符 / 类型名加后缀"""
+    with open(input_file) as f:
+        lines = f.read().splitlines()
+    with open(output_file, "w") as out:
+        for copy in range(scale):
+            sfx = _suffix(copy)
+            for line in lines:
+                parts = line.split("|")
+                if len(parts) > max(FUNCT6_FUNCT3_MNEMONIC_COLS):
+                    for col in FUNCT6_FUNCT3_MNEMONIC_COLS:
+                        name = parts[col].strip()
+                        if name:
+                            parts[col] = f" {name}{sfx} "
+                out.write("|".join(parts) + "\n")# }}}
+
+def scale_vs1_vs2(input_file, output_file, scale):# {{{
+    """把 vs1_vs2.adoc 的各 encoding space 复制 scale 份，类型名与 funct6_funct3 的后缀一致"""
+    with open(input_file, encoding="utf-8") as f:
+        text = f.read()
+    with open(output_file, "w", encoding="utf-8") as out:
+        for copy in range(scale):
+            sfx = _suffix(copy)
+            for line in text.splitlines():
+                m = re.match(r'(\s*\.)(\w+)(\s+encoding space.*)', line)
+                if m:
+                    line = m.group(1) + m.group(2) + sfx + m.group(3)
+                out.write(line + "\n")# }}}
+
+def run_case(funct6_funct3_adoc, vs1_vs2_adoc, op_format_adoc, out_dir, sv_only, code_formats):# {{{
+    """
+    在新进程中运行一次完整流程，返回各阶段统计（不开 tracemalloc，峰值看 max_rss_kb）；
+    rows_per_s 按 wall 时间，只供展示；rows_per_cpu_s 按本线程 CPU 时间，
+    不受后台 TableWriter 线程争抢 GIL 的影响，用于和基线比较
+    """
+    metrics = gen_v_inst.stage_metrics.start(trace_memory=False)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        gen_v_inst.run_pipeline(funct6_funct3_adoc, vs1_vs2_adoc, op_format_adoc, out_dir,
+                                sv_only=sv_only, code_formats=code_formats, force=True)
+    report = metrics.report()
+    for st in report["stages"]:
+        st["rows_per_s"] = st["rows"] / st["wall_s"] if st["rows"] and st["wall_s"] else None
+        st["rows_per_cpu_s"] = st["rows"] / st["cpu_s"] if st["rows"] and st["cpu_s"] else None
+    return report# }}}
+
+def run_bench(scales, sv_only=False, code_formats=("xlsx",), workdir=None):# {{{
+    results = []
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        op_format_adoc = os.path.join(tmp, "op_format.adoc")
+        shutil.copy(os.path.join(HERE, "op_format.adoc"), op_format_adoc)
+        for scale in scales:
+            funct6_funct3_adoc = os.path.join(tmp, f"funct6_funct3_{scale}.adoc")
+            vs1_vs2_adoc = os.path.join(tmp, f"vs1_vs2_{scale}.adoc")
+            scale_funct6_funct3(os.path.join(HERE, "funct6_funct3.adoc"), funct6_funct3_adoc, scale)
+            scale_vs1_vs2(os.path.join(HERE, "vs1_vs2.adoc"), vs1_vs2_adoc, scale)
+
+            # 每个规模一个新进程，峰值 RSS 互不影响
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                case = pool.submit(run_case, funct6_funct3_adoc, vs1_vs2_adoc, op_format_adoc,
+                                   os.path.join(tmp, f"out_{scale}"), sv_only,
+                                   list(code_formats)).result()
+            case.pop("argv", None)
+            case["scale"] = scale
+            results.append(case)
+
+            rows = max(st["rows"] for st in case["stages"])
+            print(f"scale={scale}: {rows} rows, {case['wall_s']:.2f}s, "
+                  f"peak {case['max_rss_kb'] >> 10} MiB")
+            for st in case["stages"]:
+                rate = f"{st['rows_per_s']:.0f} rows/s" if st["rows_per_s"] else "-"
+                print(f"    {st['name']:<32} {st['wall_s']:8.3f}s  {rate}")
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sv_only": sv_only,
+            "code_formats": list(code_formats),
+        },
+        "results": results,
+    }# }}}
+
+def compare_baseline(report, baseline, threshold=DEFAULT_THRESHOLD):# {{{
+    """
+    按 (规模, 叶子阶段) 对比 CPU 吞吐量，按规模对比峰值 RSS；
+    返回退化说明的列表，空列表表示没有超过 threshold 的退化
+    """
+    base_cases = {case["scale"]: case for case in baseline["results"]}
+    regressions = []
+    for case in report["results"]:
+        base = base_cases.get(case["scale"])
+        if base is None:
+            continue
+        scale = case["scale"]
+
+        base_stages = {st["name"]: st for st in base["stages"]}
+        for st in case["stages"]:
+            if st["name"].startswith(WRAPPER_STAGE_PREFIX):
+                continue
+            old = base_stages.get(st["name"])
+            if not old or not old.get("rows_per_cpu_s") or not st["rows_per_cpu_s"]:
+                continue
+            if old["cpu_s"] < MIN_STAGE_SECONDS:
+                continue
+            if st["rows_per_cpu_s"] < old["rows_per_cpu_s"] * (1 - threshold):
+                regressions.append(f"scale={scale} {st['name']}: {st['rows_per_cpu_s']:.0f} rows/cpu-s, "
+                                   f"baseline {old['rows_per_cpu_s']:.0f} rows/cpu-s")
+
+        if case["max_rss_kb"] > base["max_rss_kb"] * (1 + threshold):
+            regressions.append(f"scale={scale} peak RSS: {case['max_rss_kb'] >> 10} MiB, "
+                               f"baseline {base['max_rss_kb'] >> 10} MiB")
+    return regressions# }}}
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="gen_v_inst.py 端到端基准")
+    parser.add_argument("--scales", default=DEFAULT_SCALES,
+                        help="放大倍数，逗号分隔（默认 %(default)s）")
+    parser.add_argument("--sv-only", action="store_true", help="只测 fcov 流程（不写表格文件）")
+    parser.add_argument("--code-formats", default="xlsx",
+                        help="all_v_inst_code 的输出格式，同 gen_v_inst.py（默认 %(default)s）")
+    parser.add_argument("--workdir", default=None, help="放大后的 adoc 与输出写到哪里")
+    parser.add_argument("--baseline", metavar="JSON",
+                        help="与之前 -o 保存的结果比较，有退化时退出码为 1")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="允许的退化比例（默认 %(default)s）")
+    parser.add_argument("-o", "--output", default="bench_gen_v_inst.json")
+    args = parser.parse_args()
+
+    scales = [int(x) for x in args.scales.split(",")]
+    report = run_bench(scales, args.sv_only, args.code_formats.split(","), args.workdir)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"generated: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_baseline(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"========= Regressions (> {args.threshold:.0%}) =========")
+            for r in regressions:
+                print(r)
+            sys.exit(1)
+        print("No regressions.")
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""
+静态扫描 RISC-V ELF 中的可执行段，按 all_v_inst_fcov.sv 的编码统计每条向量指令出现的次数；
+只用标准库：ELF 头 / 节头用 struct 解析，文件 mmap 后逐个 16 位 parcel 走：
+低两位不是 11 的是 16 位压缩指令，直接跳过；多个 ELF 在进程池中并行扫描
+"""
+import os
+import sys
+import json
+import mmap
+import struct
+from array import array
+from collections import Counter
+
+from v_inst_decoder import InstDecoder, load_fcov_patterns
+
+EM_RISCV = 243
+SHT_NOBITS = 8
+SHF_EXECINSTR = 0x4
+PT_LOAD = 1
+PF_X = 0x1
+
+# (ELF 头, 节头, 程序头) 格式，按 EI_CLASS 取
+_ELF_STRUCTS = {
+    1: ("<16sHHIIIIIHHHHHH", "<IIIIIIIIII", "<IIIIIIII"),
+    2: ("<16sHHIQQQIHHHHHH", "<IIQQQQIIQQ", "<IIQQQQQQ"),
+}
+
+def elf_exec_ranges(mm):# {{{
+    """
+    mm: ELF 文件内容（mmap / bytes），返回可执行内容的 [(文件偏移, 大小), ...]：
+    有节头时取带 SHF_EXECINSTR 的节，没有节头（如 strip 过节头）时取可执行的 PT_LOAD 段
+    """
+    if mm[:4] != b"\x7fELF":
+        raise ValueError("not an ELF file")
+    ei_class, ei_data = mm[4], mm[5]
+    if ei_class not in _ELF_STRUCTS:
+        raise ValueError(f"unknown ELF class {ei_class}")
+    if ei_data != 1:
+        raise ValueError("big-endian ELF is not supported")
+    ehdr_fmt, shdr_fmt, phdr_fmt = _ELF_STRUCTS[ei_class]
+
+    (_, _, e_machine, _, _, e_phoff, e_shoff, _, _,
+     e_phentsize, e_phnum, e_shentsize, e_shnum, _) = struct.unpack_from(ehdr_fmt, mm, 0)
+    if e_machine != EM_RISCV:
+        raise ValueError(f"not a RISC-V ELF (e_machine={e_machine})")
+
+    ranges = []
+    if e_shoff:
+        if e_shnum == 0:
+            # 节数超过 0xff00 时真实数目在第 0 个节头的 sh_size 中
+            e_shnum = struct.unpack_from(shdr_fmt, mm, e_shoff)[5]
+        for k in range(e_shnum):
+            sh = struct.unpack_from(shdr_fmt, mm, e_shoff + k * e_shentsize)
+            sh_type, sh_flags, sh_offset, sh_size = sh[1], sh[2], sh[4], sh[5]
+            if sh_flags & SHF_EXECINSTR and sh_type != SHT_NOBITS and sh_size:
+                ranges.append((sh_offset, sh_size))
+        return ranges
+
+    for k in range(e_phnum):
+        ph = struct.unpack_from(phdr_fmt, mm, e_phoff + k * e_phentsize)
+        if ei_class == 2:
+            p_type, p_flags, p_offset, p_filesz = ph[0], ph[1], ph[2], ph[5]
+        else:
+            p_type, p_offset, p_filesz, p_flags = ph[0], ph[1], ph[4], ph[6]
+        if p_type == PT_LOAD and p_flags & PF_X and p_filesz:
+            ranges.append((p_offset, p_filesz))
+    return ranges# }}}
+
+def iter_inst_words(data, stats=None):# {{{
+    """
+    data: 一段指令内容（bytes），逐条 yield 32 位指令字；
+    16 位压缩指令以及 48 / 64 位及更长的编码按长度跳过，
+    stats 不为空时把跳过的压缩指令数累加到 stats["compressed"]
+    """
+    parcels = array("H")
+    parcels.frombytes(data[:len(data) & ~1])
+    if sys.byteorder == "big":
+        parcels.byteswap()
+    n = len(parcels)
+    k = 0
+    while k < n:
+        h = parcels[k]
+        if h & 0x3 != 0x3:
+            if stats is not None:
+                stats["compressed"] += 1
+            k += 1
+        elif h & 0x1f != 0x1f:
+            if k + 1 < n:
+                yield h | parcels[k + 1] << 16
+            k += 2
+        elif h & 0x3f == 0x1f:
+            k += 3
+        elif h & 0x7f == 0x3f:
+            k += 4
+        else:
+            nnn = h >> 12 & 0x7
+            k += 5 + nnn if nnn != 0x7 else 1# }}}
+
+def scan_elf(elf_file, decoder):# {{{
+    """
+    返回 {"file", "words", "compressed", "counts": Counter(指令 id -> 次数)}，
+    "error" 为无法解析时的原因
+    """
+    result = {"file": elf_file, "words": 0, "compressed": 0, "counts": Counter()}
+    lookup = decoder.decode_id
+    try:
+        with open(elf_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            counts = result["counts"]
+            for offset, size in elf_exec_ranges(mm):
+                words = 0
+                for word in iter_inst_words(mm[offset:offset + size], result):
+                    words += 1
+                    i = lookup(word)
+                    if i is not None:
+                        counts[i] += 1
+                result["words"] += words
+    except (ValueError, OSError, struct.error) as e:
+        result["error"] = str(e)
+    return result# }}}
+
+def collect_elfs(paths):# {{{
+    """文件原样保留，目录递归取其中以 ELF 魔数开头的文件"""
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        for root, _, names in os.walk(path):
+            for name in sorted(names):
+                full = os.path.join(root, name)
+                try:
+                    with open(full, "rb") as f:
+                        if f.read(4) == b"\x7fELF":
+                            files.append(full)
+                except OSError:
+                    pass
+    return files# }}}
+
+_worker_decoder = None
+
+def _init_worker(patterns):# {{{
+    global _worker_decoder
+    _worker_decoder = InstDecoder(patterns)# }}}
+
+def _scan_worker(elf_file):# {{{
+    return scan_elf(elf_file, _worker_decoder)# }}}
+
+def scan_elfs(fcov_file, paths, jobs=None):# {{{
+    """
+    并行扫描 paths 中的 ELF，返回：
+    {"names": [指令名, ...], "files": [scan_elf 结果, ...], "counts": Counter(指令 id -> 总次数)}
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    patterns = load_fcov_patterns(fcov_file)
+    files = collect_elfs(paths)
+    if jobs == 1 or len(files) <= 1:
+        decoder = InstDecoder(patterns)
+        results = [scan_elf(f, decoder) for f in files]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                 initargs=(patterns,)) as pool:
+            results = list(pool.map(_scan_worker, files, chunksize=8))
+
+    total = Counter()
+    for r in results:
+        total.update(r["counts"])
+    return {"names": [p[0] for p in patterns], "files": results, "counts": total}# }}}
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="静态统计 RISC-V ELF 中各向量指令的出现次数")
+    parser.add_argument("fcov_file", help="all_v_inst_fcov.sv")
+    parser.add_argument("elfs", nargs="+", help="ELF 文件或目录（递归查找 ELF）")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="进程数（默认 CPU 核数）")
+    parser.add_argument("--show", choices=("hit", "miss", "all", "none"), default="hit",
+                        help="列出哪些指令（默认 %(default)s）")
+    parser.add_argument("-o", "--output", help="把汇总和每个文件的计数写成 JSON")
+    args = parser.parse_args()
+
+    result = scan_elfs(args.fcov_file, args.elfs, args.jobs)
+    names, counts = result["names"], result["counts"]
+    for r in result["files"]:
+        if "error" in r:
+            print(f"WARNING: {r['file']}: {r['error']}")
+
+    if args.show != "none":
+        for i, name in enumerate(names):
+            if (args.show == "all" or (args.show == "hit" and counts[i])
+                    or (args.show == "miss" and not counts[i])):
+                print(f"{counts[i]:>10}  {name}")
+    scanned = [r for r in result["files"] if "error" not in r]
+    print(f"files: {len(scanned)}, 32-bit words: {sum(r['words'] for r in scanned)}, "
+          f"16-bit parcels: {sum(r['compressed'] for r in scanned)}, "
+          f"vector instructions: {sum(counts.values())}, "
+          f"covered: {sum(1 for i in range(len(names)) if counts[i])}/{len(names)}")
+
+    if args.output:
+        report = {
+            "counts": {names[i]: c for i, c in sorted(counts.items())},
+            "files": [dict(r, counts={names[i]: c for i, c in sorted(r["counts"].items())})
+                      for r in result["files"]],
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"generated: {args.output}")
@@ -4,34 +4,188 @@
 import sys
 import re
 import os
-import pandas as pd
+import json
+import hashlib
+import queue
+import threading
+import importlib.util
 
-def gen_funct6_funct3_inst(input_file, output_file="output.xlsx"):# {{{
-    group_info = [
-        (["V", "X", "I"], {"V": "OPIVV", "X": "OPIVX", "I": "OPIVI"}, 5),
-        (["V", "X"], {"V": "OPMVV", "X": "OPMVX"}, 4),
-        (["V", "F"], {"V": "OPFVV", "F": "OPFVF"}, 4),
-    ]
+def _load_stage_metrics():# {{{
+    """
+    stage_metrics.py 在仓库根目录，与 detect_encoding_conflicts.py 共用；
+    按路径加载，不改 sys.path，已经 import 过时沿用同一个模块（共用 METRICS）
+    """
+    if "stage_metrics" in sys.modules:
+        return sys.modules["stage_metrics"]
+    path = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                                         "stage_metrics.py"))
+    spec = importlib.util.spec_from_file_location("stage_metrics", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["stage_metrics"] = module
+    spec.loader.exec_module(module)
+    return module# }}}
 
-    with open(input_file, "r") as f:
-        input_data = f.read()
+stage_metrics = _load_stage_metrics()
+_stage = stage_metrics.stage
+# pandas / openpyxl / pyarrow 只在需要表格文件或整列编码时才在函数内 import，
+# --sv-only 全程只用标准库
 
-    group_outputs = [[] for _ in group_info]
+INST_COLUMNS = ["assembly", "funct6", "funct3", "vs1", "vs2", "vm"]
+STAGE_MANIFEST = ".stage_manifest.json"
+STAGE_CACHE_DIR = ".stage_cache"
 
-    for line in input_data.splitlines():
-        line = line.strip()
-        if not line or line.startswith("|==="):
-            continue
+# 列式格式每批写出的行数
+ARROW_BATCH_ROWS = 65536
+TABLE_FORMATS = ("xlsx", "csv", "parquet", "feather")
+
+def _iter_table_rows(records, columns):# {{{
+    """
+    records: 记录表（可迭代的字典）或 DataFrame，逐行 yield 按 columns 排列的元组；
+    None / NaN / 空串统一为 None（写出为空单元格）
+    """
+    if hasattr(records, "itertuples"):
+        rows = records.reindex(columns=columns).itertuples(index=False, name=None)
+    else:
+        rows = (tuple(row.get(c) for c in columns) for row in records)
+    for row in rows:
+        yield tuple(None if _is_empty(v) else v for v in row)# }}}
+
+def write_xlsx(records, output_file, columns=INST_COLUMNS):# {{{
+    """openpyxl write-only 模式逐行写出，内存占用与行数无关"""
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    ws.append(columns)
+    for row in _iter_table_rows(records, columns):
+        ws.append(row)
+    wb.save(output_file)
+    print(f"generated: {output_file}")# }}}
+
+def write_csv(records, output_file, columns=INST_COLUMNS):# {{{
+    import csv
+    with open(output_file, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(columns)
+        w.writerows(_iter_table_rows(records, columns))
+    print(f"generated: {output_file}")# }}}
+
+def write_arrow(records, output_file, columns=INST_COLUMNS):# {{{
+    """
+    写 Parquet（.parquet）或 Feather（.feather），所有列都是字符串；
+    每 ARROW_BATCH_ROWS 行写一批，需要 pyarrow
+    """
+    import pyarrow as pa
+    schema = pa.schema([(c, pa.string()) for c in columns])
+    if output_file.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        sink = pq.ParquetWriter(output_file, schema)
+        write_batch = sink.write_batch
+    else:
+        import pyarrow.feather  # noqa: F401 注册 feather 格式
+        sink = pa.ipc.new_file(output_file, schema)
+        write_batch = sink.write_batch
 
-        parts = [p.strip() for p in line.split("|")]
-        if parts and parts[0] == '':
-            parts = parts[1:]
-        if parts and parts[-1] == '':
-            parts = parts[:-1]
+    def flush(batch):
+        cols = [pa.array([None if v is None else str(v) for v in col], pa.string())
+                for col in zip(*batch)]
+        write_batch(pa.RecordBatch.from_arrays(cols, schema=schema))
 
-        idx = 0
-        for g, (col_names, col_map, group_len) in enumerate(group_info):
-            if idx + group_len <= len(parts):
+    try:
+        batch = []
+        for row in _iter_table_rows(records, columns):
+            batch.append(row)
+            if len(batch) == ARROW_BATCH_ROWS:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+    finally:
+        sink.close()
+    print(f"generated: {output_file}")# }}}
+
+def write_table(records, output_file, columns=INST_COLUMNS):# {{{
+    """按扩展名选择 xlsx / csv / parquet / feather 写出"""
+    ext = os.path.splitext(output_file)[1].lstrip(".")
+    if ext == "xlsx":
+        write = write_xlsx
+    elif ext == "csv":
+        write = write_csv
+    elif ext in ("parquet", "feather"):
+        write = write_arrow
+    else:
+        raise ValueError(f"Unknown table format: {output_file}")
+    with _stage("write:" + os.path.basename(output_file)) as st:
+        if hasattr(records, "itertuples"):
+            st["rows"] = len(records)
+        else:
+            records = _count_rows(records, st)
+        write(records, output_file, columns)# }}}
+
+def _count_rows(records, st):# {{{
+    """边迭代边把行数累加到阶段统计 st["rows"]"""
+    for row in records:
+        st["rows"] += 1
+        yield row# }}}
+
+class TableWriter:# {{{
+    """
+    后台线程写表格文件：submit() 只把记录表放入队列，close() 等待全部写完
+    """
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self._error is None:
+                try:
+                    write_table(*item)
+                except Exception as e:
+                    self._error = e
+
+    def submit(self, records, output_file, columns=INST_COLUMNS):
+        self._queue.put((records, output_file, columns))
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error# }}}
+
+# funct6_funct3.adoc 每行的三组列：(标记列, 标记列 -> funct3, 该组占的列数)
+FUNCT6_FUNCT3_GROUPS = [
+    (["V", "X", "I"], {"V": "OPIVV", "X": "OPIVX", "I": "OPIVI"}, 5),
+    (["V", "X"], {"V": "OPMVV", "X": "OPMVX"}, 4),
+    (["V", "F"], {"V": "OPFVV", "F": "OPFVF"}, 4),
+]
+
+def iter_funct6_funct3_inst(input_file):# {{{
+    """
+    逐行读取 funct6_funct3.adoc，逐条 yield 记录（列同 INST_COLUMNS），内存占用与文件大小无关：
+        {"assembly": "vadd_OPIVV", "funct6": "000000", "funct3": "OPIVV", "vs1": "", "vs2": "", "vm": ""}
+    为保持原有顺序（先 OPIV*、再 OPMV*、最后 OPFV*），每组各读一遍文件
+    """
+    idx = 0
+    for col_names, col_map, group_len in FUNCT6_FUNCT3_GROUPS:
+        with open(input_file, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("|==="):
+                    continue
+
+                parts = [p.strip() for p in line.split("|")]
+                if parts and parts[0] == '':
+                    parts = parts[1:]
+                if parts and parts[-1] == '':
+                    parts = parts[:-1]
+
+                if idx + group_len > len(parts):
+                    continue
                 code = parts[idx]
                 cols = parts[idx+1:idx+1+len(col_names)]
                 mnemonic = parts[idx+1+len(col_names)]
@@ -40,34 +194,25 @@ def gen_funct6_funct3_inst(input_file, output_file="output.xlsx"):# {{{
                     if col_value:
                         op = col_map.get(name)
                         if op:
-                            group_outputs[g].append([f"{mnemonic}_{op}", code, op])
-
-            idx += group_len
-
-    # 将所有组合并为一个列表
-    all_rows = []
-    for out in group_outputs:
-        all_rows.extend(out)
-        # all_rows.append(["", "", ""])  # 每组后空行
-
-    # 写入 Excel
-    # df = pd.DataFrame(all_rows, columns=["assembly", "funct6", "funct3", "vs1", "vs2", "vm"])
-    df = pd.DataFrame(all_rows, columns=["assembly", "funct6", "funct3"])
-    df["vs1"] = ""
-    df["vs2"] = ""
-    df["vm"] = ""
-    df.to_excel(output_file, index=False)
-    print(f"generated: {output_file}")# }}}
+                            yield {"assembly": f"{mnemonic}_{op}", "funct6": code, "funct3": op,
+                                   "vs1": "", "vs2": "", "vm": ""}
+        idx += group_len# }}}
 
-def parse_vs1_vs2_adoc(adoc_file):# {{{
+def gen_funct6_funct3_inst(input_file, output_file=None):# {{{
     """
-    解析 .adoc 文件，返回列表：
-    [
-        {"type": "VWXUNARY0", "field": "vs1", "bits": "00000", "mnemonic": "vmv.x.s"},
-        ...
-    ]
+    解析 funct6_funct3.adoc，返回记录列表（见 iter_funct6_funct3_inst），
+    output_file 不为空时同时写出 xlsx
+    """
+    records = list(iter_funct6_funct3_inst(input_file))
+    if output_file:
+        write_xlsx(records, output_file)
+    return records# }}}
+
+def iter_vs1_vs2_adoc(adoc_file):# {{{
+    """
+    逐行解析 .adoc 文件，逐条 yield：
+        {"type": "VWXUNARY0", "field": "vs1", "bits": "00000", "mnemonic": "vmv.x.s"}
     """
-    results = []
     current_type = None
     current_field = None
 
@@ -93,27 +238,29 @@ def parse_vs1_vs2_adoc(adoc_file):# {{{
             m = re.match(r'\|\s*([01]{5})\s*\|\s*(\S+)', line)
             if m and current_type and current_field:
                 bits, mnemonic = m.groups()
-                results.append({
+                yield {
                     "type": current_type,
                     "field": current_field,
                     "bits": bits,
                     "mnemonic": mnemonic
-                })
-    # print(results)
-    return results# }}}
+                }# }}}
 
-def parse_funct6_funct3_inst_xlsx(excel_file):# {{{
+def parse_vs1_vs2_adoc(adoc_file):# {{{
     """
-    读取 Excel 文件，返回字典：
+    解析 .adoc 文件，返回列表（见 iter_vs1_vs2_adoc）
+    """
+    return list(iter_vs1_vs2_adoc(adoc_file))# }}}
+
+def build_opcode_map(records):# {{{
+    """
+    由 gen_funct6_funct3_inst 的记录生成字典：
     {
         "VWXUNARY0": ("VWXUNARY0_OPMVV", "10000", "OPMVV"),
         ...
     }
     """
-    df = pd.read_excel(excel_file, dtype=str)
-
     opcode_map = {}
-    for _, row in df.iterrows():
+    for row in records:
         assembly = str(row["assembly"]).strip()
         funct6 = str(row["funct6"]).strip()
         funct3 = str(row["funct3"]).strip()
@@ -122,16 +269,15 @@ def parse_funct6_funct3_inst_xlsx(excel_file):# {{{
     # print(opcode_map)
     return opcode_map# }}}
 
-def merge_vs1_vs2_doc_and_funct6_funct3_inst_xlsx(adoc_entries, opcode_map):# {{{
+def parse_funct6_funct3_inst_xlsx(excel_file):# {{{
     """
-    合并 adoc 数据和 Excel 数据，返回结果列表
-    [
-        {"assembly": ..., "funct6": ..., "funct3": ..., "vs1": ..., "vs2": ..., "vm": ""},
-        ...
-    ]
+    读取 gen_funct6_funct3_inst 写出的 Excel 文件，返回同 build_opcode_map
     """
-    results = []
+    import pandas as pd
+    df = pd.read_excel(excel_file, dtype=str)
+    return build_opcode_map(df.to_dict("records"))# }}}
 
+def _iter_merge_vs1_vs2(adoc_entries, opcode_map):# {{{
     for entry in adoc_entries:
         typ = entry["type"]
         field = entry["field"]
@@ -150,45 +296,67 @@ def merge_vs1_vs2_doc_and_funct6_funct3_inst_xlsx(adoc_entries, opcode_map):# {{
         suffix = "rs1" if vs1 else "rs2"
         assembly = f"{opcode_asm}_{suffix}_{mnemonic}"
 
-        results.append({
+        yield {
             "assembly": assembly,
             "funct6": funct6,
             "funct3": funct3,
             "vs1": vs1,
             "vs2": vs2,
             "vm": ""
-        })
+        }# }}}
+
+def merge_vs1_vs2_doc_and_funct6_funct3_inst_xlsx(adoc_entries, opcode_map):# {{{
+    """
+    合并 adoc 数据和 Excel 数据，返回结果列表
+    [
+        {"assembly": ..., "funct6": ..., "funct3": ..., "vs1": ..., "vs2": ..., "vm": ""},
+        ...
+    ]
+    """
+    return list(_iter_merge_vs1_vs2(adoc_entries, opcode_map))# }}}
+
+def iter_vs1_vs2_inst(adoc_file, funct6_funct3_records):# {{{
+    """
+    逐条 yield vs1/vs2 子编码指令的记录；
+    opcode map 只取 funct6_funct3_records 中首字母大写的行（即 VWXUNARY0 这类类型行）
+    """
+    opcode_map = build_opcode_map(row for row in funct6_funct3_records
+                                  if not row["assembly"][:1].islower())
+    count = 0
+    for record in _iter_merge_vs1_vs2(iter_vs1_vs2_adoc(adoc_file), opcode_map):
+        count += 1
+        yield record
 
-    return results# }}}
-
-def gen_vs1_vs2_inst(adoc_file, excel_file, output_excel="result.xlsx"):# {{{
-    adoc_entries = parse_vs1_vs2_adoc(adoc_file)
-    opcode_map = parse_funct6_funct3_inst_xlsx(excel_file)
-    merged_results = merge_vs1_vs2_doc_and_funct6_funct3_inst_xlsx(adoc_entries, opcode_map)
-
-    if not merged_results:
-        print("⚠ 未解析到任何结果，请检查 adoc 与 Excel 是否匹配前缀")
-        return False
-
-    df_out = pd.DataFrame(merged_results)
-    df_out.to_excel(output_excel, index=False)
-    print("generated:", output_excel)
-    return True# }}}
-
-def merge_all_inst(file1, file2, output_file):# {{{
-    df1 = pd.read_excel(file1, dtype=str)
-    df2 = pd.read_excel(file2, dtype=str)
-    
-    # 过滤掉 assembly 首字母大写的行
-    df1_filtered = df1[df1['assembly'].str[0].str.islower()]
-    
-    # 合并两个表格
-    # 注意 df2 默认带标题，不需要再去掉标题行
-    all_df = pd.concat([df1_filtered, df2], ignore_index=True)
-    
-    # 输出 Excel
-    all_df.to_excel(output_file, index=False)
-    print(f"merged insts file: {output_file}")# }}}
+    if not count:
+        print("⚠ 未解析到任何结果，请检查 adoc 与 Excel 是否匹配前缀")# }}}
+
+def gen_vs1_vs2_inst(adoc_file, funct6_funct3_records, output_excel=None):# {{{
+    """
+    返回 vs1/vs2 子编码指令的记录列表，output_excel 不为空时同时写出 xlsx
+    """
+    merged_results = list(iter_vs1_vs2_inst(adoc_file, funct6_funct3_records))
+    if merged_results and output_excel:
+        write_xlsx(merged_results, output_excel)
+    return merged_results# }}}
+
+def iter_all_inst(records1, records2):# {{{
+    """
+    依次 yield records1 中的指令行（过滤掉 assembly 首字母大写的类型行）和 records2
+    """
+    for row in records1:
+        if row["assembly"][:1].islower():
+            yield row
+    yield from records2# }}}
+
+def merge_all_inst(records1, records2, output_file=None):# {{{
+    """
+    合并 gen_funct6_funct3_inst 与 gen_vs1_vs2_inst 的记录，
+    output_file 不为空时同时写出 xlsx
+    """
+    all_records = list(iter_all_inst(records1, records2))
+    if output_file:
+        write_xlsx(all_records, output_file)
+    return all_records# }}}
 
 
 # 解析 WaveDrom 模板
@@ -257,96 +425,888 @@ def select_template(templates, funct3_val):# {{{
             return t["reg"]
     return None# }}}
 
+def _const_field_bits(name, width):# {{{
+    """常数字段（0x57 / 0 / 1 ...）返回补齐后的二进制串，变量字段返回 None"""
+    try:
+        return bin(int(name, 0))[2:].zfill(width)
+    except ValueError:
+        return None# }}}
+
+def _is_empty(val):# {{{
+    """None / NaN / 空串 都视为 Excel 中没有值"""
+    return val is None or val != val or str(val).strip() == ""# }}}
+
+def _check_field(col_name, v, width):# {{{
+    """v: 去掉首尾空白后的非空字段值，必须是不超过 width 位的二进制串，否则抛出 ValueError"""
+    if not re.fullmatch(r"[01]+", v):
+        raise ValueError(f"{col_name}={v} is not a binary number")
+    if len(v) > width:
+        raise ValueError(f"{col_name}={v} wider than {width} bits")# }}}
+
+class InstEncoder:# {{{
+    """
+    编译后的 WaveDrom 模板：
+    - const_val / const_mask: 所有常数字段（opcode、funct3 等）合成的值和掩码
+    - fields: 变量字段 [(列名, shift, width), ...]，列名为小写的字段名
+    - segments: 从高位到低位的 [(width, 常数二进制串或 None, 列名), ...]，用于拼字符串
+    编码一行只需几次移位和或运算，"32'b..._.." 字符串只在需要时才生成
+    """
+    def __init__(self, template):
+        self.attr = template[0].get("attr") if template else None
+        self.const_val = 0
+        self.const_mask = 0
+        self.fields = []
+        self.segments = []
+
+        shift = 0
+        for f in template:
+            name = f.get("name")
+            width = f.get("bits", 0)
+            const = _const_field_bits(name, width)
+            if const is not None:
+                self.const_val |= int(const, 2) << shift
+                self.const_mask |= ((1 << width) - 1) << shift
+                self.segments.append((width, const, None))
+            else:
+                self.fields.append((name.lower(), shift, width))
+                self.segments.append((width, None, name.lower()))
+            shift += width
+        self.width = shift
+        self.segments.reverse()
+
+    def encode(self, row):
+        """row: 字典 / Series，返回 (val, mask)，mask 为 0 的位即 ?"""
+        val = self.const_val
+        mask = self.const_mask
+        for col_name, shift, width in self.fields:
+            v = row.get(col_name)
+            if _is_empty(v):
+                continue
+            v = str(v).strip()
+            _check_field(col_name, v, width)
+            val |= int(v, 2) << shift
+            mask |= ((1 << width) - 1) << shift
+        return val, mask
+
+    def format_code(self, val, mask):
+        bits = "".join(c if m == "1" else "?" for c, m in
+                       zip(format(val, f"0{self.width}b"), format(mask, f"0{self.width}b")))
+        chunks = []
+        pos = 0
+        for width, _, _ in self.segments:
+            chunks.append(bits[pos:pos + width])
+            pos += width
+        return "32'b" + "_".join(chunks)
+
+    def gen_code(self, row):
+        return self.format_code(*self.encode(row))# }}}
+
+def compile_templates(templates):# {{{
+    """
+    parse_wavedrom_adoc 的结果编译为 {funct3 attr: InstEncoder}，按格式 O(1) 查找
+    """
+    encoders = {}
+    for t in templates:
+        enc = InstEncoder(t["reg"])
+        attrs = enc.attr if isinstance(enc.attr, list) else [enc.attr]
+        for attr in attrs:
+            if attr is not None and attr not in encoders:
+                encoders[attr] = enc
+    return encoders# }}}
+
+def _encoder_for(encoders, funct3):# {{{
+    """按 funct3 取编译好的模板，没有对应模板时抛 ValueError"""
+    enc = encoders.get(funct3)
+    if enc is None:
+        raise ValueError(f"No matching template found for funct3={funct3}")
+    return enc# }}}
+
 def gen_single_inst_code(template, row):# {{{
     """
     根据 WaveDrom template 和 Excel 行，生成 32bit 指令编码字符串
     - template: [{'bits': 7, 'name': '0x57'}, {'bits': 5, 'name': 'vd'}, ...]
     - row: Excel 一行，包含字段值
+    批量编码请先 compile_templates，再直接用 InstEncoder
     """
-    code_bits = []
-    
-    for f in template:
-        name = f.get("name")
-        width = f.get("bits", 0)
-        
-        # opcode / 常数字段，例如 0x57
-        if name.startswith("0x"):
-            val = bin(int(name, 16))[2:].zfill(width)
-            code_bits.append(val)
-            continue
+    return InstEncoder(template).gen_code(row)# }}}
 
-        # 如果 name 本身是数字
-        try:
-            val_int = int(name, 0)  # 支持 10 进制或 0x 十六进制
-            val_bin = bin(val_int)[2:].zfill(width)
-            code_bits.append(val_bin)
+def gen_inst_code_column(encoders, df):# {{{
+    """
+    按 funct3 分组，整列拼接各字段，一次生成 df 所有行的编码，
+    结果与逐行调用 InstEncoder.gen_code 相同：
+    返回与 df 同 index 的 Series，例如 "32'b000000_?_?????_?????_000_?????_1010111"
+    """
+    import pandas as pd
+    codes = pd.Series("", index=df.index, dtype=object)
+    for funct3, idx in df.groupby("funct3", sort=False, dropna=False).groups.items():
+        enc = _encoder_for(encoders, funct3)
+
+        sub = df.loc[idx]
+        fields = []
+        for width, const, col_name in enc.segments:
+            if const is not None:
+                fields.append(pd.Series(const, index=idx))
+                continue
+
+            if col_name not in sub:
+                fields.append(pd.Series("?" * width, index=idx))
+                continue
+            col = sub[col_name].fillna("").astype(str).str.strip()
+            # 与 InstEncoder.encode 相同的检查，两条路径接受同样的输入
+            bad = (col != "") & ~col.str.fullmatch(f"[01]{{1,{width}}}")
+            if bad.any():
+                _check_field(col_name, col[bad].iloc[0], width)
+            fields.append(col.where(col != "", "?" * width).str.zfill(width))
+
+        codes[idx] = "32'b" + fields[0].str.cat(fields[1:], sep="_")
+    return codes# }}}
+
+def gen_all_inst_code_fcov(template_file, inst_records, output_excel, output_fcov, encoders=None):# {{{
+    """
+    生成所有指令的编码并写出 fcov，返回带 "code" 列的 DataFrame；
+    output_excel 不为空时同时写出 xlsx；
+    encoders: 已编译的模板（compile_templates），给出时不再解析 template_file
+    """
+    with _stage("import_pandas"):
+        import pandas as pd
+    if encoders is None:
+        with _stage("parse_templates"):
+            encoders = compile_templates(parse_wavedrom_adoc(template_file))
+    with _stage("load_records") as st:
+        df = pd.DataFrame(list(inst_records), columns=INST_COLUMNS)
+        st["rows"] = len(df)
+    with _stage("encode") as st:
+        df["code"] = gen_inst_code_column(encoders, df)
+        st["rows"] = len(df)
+
+    # 写入 fcov 文件
+    with _stage("fcov_write") as st:
+        lines = "wildcard " + df["assembly"].fillna("").str.strip() + " = {" + df["code"] + "};\n"
+        with open(output_fcov, "w") as f_fcov:
+            f_fcov.write("".join(lines))
+        st["rows"] = len(df)
+
+    if output_excel:
+        write_xlsx(df, output_excel, INST_COLUMNS + ["code"])
+    print("generated: ", output_fcov)
+    return df# }}}
+
+def iter_inst_code(encoders, inst_records):# {{{
+    """逐行编码，逐条 yield 带 "code" 的记录"""
+    for row in inst_records:
+        yield dict(row, code=_encoder_for(encoders, row.get("funct3")).gen_code(row))# }}}
+
+def iter_inst_patterns(encoders, inst_records):# {{{
+    """
+    逐行编码，逐条 yield (assembly, val, mask)，mask 为固定位；
+    导出 MATCH/MASK、分层 covergroup 和 v_inst_decoder.patterns_from_records 都经过这里
+    """
+    for row in inst_records:
+        yield (row.get("assembly", "").strip(), *_encoder_for(encoders, row.get("funct3")).encode(row))# }}}
+
+def write_fcov(code_records, output_fcov):# {{{
+    """边读记录边写 fcov，返回写出的行数"""
+    count = 0
+    with open(output_fcov, "w") as f_fcov:
+        for row in code_records:
+            assembly = row.get("assembly", "").strip()
+            f_fcov.write(f"wildcard {assembly} = {{{row['code']}}};\n")
+            count += 1
+    print("generated: ", output_fcov)
+    return count# }}}
+
+def gen_all_inst_fcov(template_file, inst_records, output_fcov, encoders=None):# {{{
+    """
+    只用标准库逐行编码并写出 fcov（不需要 xlsx 时使用）；
+    inst_records 可以是生成器，边解析边写，返回写出的行数
+    """
+    if encoders is None:
+        with _stage("parse_templates"):
+            encoders = compile_templates(parse_wavedrom_adoc(template_file))
+    # 逐行流水：读记录、编码、写 fcov 交织进行，合并为一个阶段统计
+    with _stage("encode+fcov_write") as st:
+        st["rows"] = write_fcov(iter_inst_code(encoders, inst_records), output_fcov)
+    return st["rows"]# }}}
+
+# 分层 covergroup 用到的指令字段：(名字, 高位, 低位)，顺序即 cross 中坐标的顺序
+V_INST_FIELDS = [
+    ("funct6", 31, 26),
+    ("funct3", 14, 12),
+    ("vs2", 24, 20),
+    ("vs1", 19, 15),
+    ("vm", 25, 25),
+    ("vd", 11, 7),
+    ("opcode", 6, 0),
+]
+
+def _split_fields(val, mask):# {{{
+    """
+    (val, mask) -> {字段名: 固定值}；某个字段只固定了一部分位时返回 None（无法分解成字段的组合）
+    """
+    fixed = {}
+    for name, hi, lo in V_INST_FIELDS:
+        fmask = ((1 << (hi - lo + 1)) - 1) << lo
+        if mask & fmask == fmask:
+            fixed[name] = (val & fmask) >> lo
+        elif mask & fmask:
+            return None
+    return fixed# }}}
+
+def _field_cube(fields):# {{{
+    """{字段名: 值} -> (val, mask)，_split_fields 的逆运算"""
+    val = mask = 0
+    for name, hi, lo in V_INST_FIELDS:
+        if name in fields:
+            mask |= ((1 << (hi - lo + 1)) - 1) << lo
+            val |= fields[name] << lo
+    return val, mask# }}}
+
+def build_hier_covergroup(patterns):# {{{
+    """
+    patterns: [ (name, val, mask), ... ]（与 all_v_inst_fcov.sv 同序）
+    把每个 wildcard bin 分解成字段取值：所有编码都固定且取值相同的字段（opcode）作为 iff 条件，
+    其余固定字段作为 cross 的坐标，固定字段集合相同的编码放进同一个 cross；
+    cross 的自动 bin 中不对应任何编码的组合用 ignore_bins 排除。返回：
+    {
+        "guard":      {字段名: 值},
+        "points":     {字段名: [值, ...]},             各 coverpoint 的 bins
+        "crosses":    [ {"fields": (字段名, ...), "bins": [(name, (值, ...)), ...],
+                         "ignore": [(前缀 ((字段名, 值), ...), 字段名, 合法值集合), ...]}, ... ],
+        "flat":       [ (name, val, mask), ... ],       无法分解的编码，仍用 wildcard bins
+    }
+    ignore 规则 (prefix, f, legal) 表示 "前缀字段都取给定值、且 f 不在 legal 中" 的组合
+    """
+    split = [(name, val, mask, _split_fields(val, mask)) for name, val, mask in patterns]
+
+    guard = None
+    for _, _, _, fields in split:
+        if fields is None:
             continue
-        except:
-            pass  # 非数字字段，继续处理 Excel 列匹配
-        # 对应 Excel 列
-        col_name = name.lower()  # 小写匹配
-        val = row.get(col_name)
-        
-        if pd.isna(val) or str(val).strip() == "":
-            # Excel 中没有值，用 ? 占位
-            val_bin = "?" * width
+        if guard is None:
+            guard = dict(fields)
         else:
-            # Excel 本身就是二进制字符串，去掉空格并补齐
-            val_str = str(val).strip()
-            val_bin = val_str.zfill(width)
+            guard = {k: v for k, v in guard.items() if fields.get(k) == v}
+    guard = guard or {}
+
+    crosses = {}
+    flat = []
+    points = {}
+    for name, val, mask, fields in split:
+        coords = None if fields is None else {k: v for k, v in fields.items() if k not in guard}
+        if coords is None or len(coords) < 2:
+            flat.append((name, val, mask))
+            continue
+        key = tuple(f for f, _, _ in V_INST_FIELDS if f in coords)
+        crosses.setdefault(key, []).append((name, tuple(coords[f] for f in key)))
+        for f in key:
+            points.setdefault(f, set()).add(coords[f])
+    points = {f: sorted(points[f]) for f, _, _ in V_INST_FIELDS if f in points}
 
-        code_bits.append(val_bin)
+    result = []
+    for key, bins in crosses.items():
+        legal = {values for _, values in bins}
+        ignore = []
 
-    # 拼成 SystemVerilog 风格
-    code_bits = code_bits[::-1]  # 反转列表
-    return "32'b" + "_".join(code_bits)# }}}
+        def add_ignore(prefix, depth, tuples):
+            f = key[depth]
+            values = {t[depth] for t in tuples}
+            if values != set(points[f]):
+                ignore.append((prefix, f, values))
+            if depth + 1 < len(key):
+                for v in sorted(values):
+                    add_ignore(prefix + ((f, v),), depth + 1, [t for t in tuples if t[depth] == v])
 
-def gen_all_inst_code_fcov(template_file, input_excel, output_excel, output_fcov):# {{{
-    templates = parse_wavedrom_adoc(template_file)
-    df = pd.read_excel(input_excel, dtype=str)
+        add_ignore((), 0, legal)
+        result.append({"fields": key, "bins": bins, "ignore": ignore})
 
-    codes = []
-    with open(output_fcov, "w") as f_fcov:
-        for _, row in df.iterrows():
-            funct3 = row.get("funct3")
-            tmpl = select_template(templates, funct3)
-            if tmpl:
-                code = gen_single_inst_code(tmpl, row)
+    cg = {"guard": guard, "points": points, "crosses": result, "flat": flat}
+    _check_hier_covergroup(cg, patterns)
+    return cg# }}}
+
+def _check_hier_covergroup(cg, patterns):# {{{
+    """
+    等价性检查：
+    1. 每个具名 cross bin（或 flat bin）对应的 32 位 cube 与原 wildcard bin 完全相同，且一一对应；
+    2. 每个 cross 的自动 bin（各 coverpoint bins 的笛卡尔积）去掉 ignore_bins 后恰好是具名 bins 的坐标
+    不成立时抛 ValueError
+    """
+    cubes = []
+    for cross in cg["crosses"]:
+        for name, values in cross["bins"]:
+            cubes.append((name, *_field_cube(dict(cg["guard"], **dict(zip(cross["fields"], values))))))
+    cubes.extend(cg["flat"])
+    if sorted(cubes) != sorted(patterns):
+        raise ValueError("hierarchical covergroup bins differ from the wildcard bins")
+
+    for cross in cg["crosses"]:
+        key = cross["fields"]
+        legal = {values for _, values in cross["bins"]}
+        kept = set()
+
+        # 沿坐标逐层展开未被 ignore 的组合（不枚举完整的笛卡尔积），多于具名 bins 即可判定不等
+        def expand(prefix):
+            if len(prefix) == len(key):
+                kept.add(prefix)
+                if len(kept) > len(legal):
+                    raise ValueError(f"ignore_bins of cross {key} do not match its bins")
+                return
+            f = key[len(prefix)]
+            coords = dict(zip(key, prefix))
+            allowed = cg["points"][f]
+            for rule_prefix, rule_field, rule_legal in cross["ignore"]:
+                if rule_field == f and all(coords[p] == v for p, v in rule_prefix):
+                    allowed = [v for v in allowed if v in rule_legal]
+            for v in allowed:
+                expand(prefix + (v,))
+
+        expand(())
+        if kept != legal:
+            raise ValueError(f"ignore_bins of cross {key} do not match its bins")# }}}
+
+def _field_width(name):# {{{
+    for f, hi, lo in V_INST_FIELDS:
+        if f == name:
+            return hi - lo + 1
+    raise KeyError(name)# }}}
+
+def _field_bin(name, value):# {{{
+    """coverpoint 中某个取值的 bin 名，如 b000000"""
+    return "b" + format(value, f"0{_field_width(name)}b")# }}}
+
+def _field_literal(name, value):# {{{
+    width = _field_width(name)
+    return f"{width}'b" + format(value, f"0{width}b")# }}}
+
+def write_hier_covergroup(cg, output_sv, cg_name="v_inst_cg"):# {{{
+    """把 build_hier_covergroup 的结果写成 SV covergroup，返回具名 bin 数"""
+    slices = {name: f"instr[{hi}:{lo}]" if hi != lo else f"instr[{hi}]" for name, hi, lo in V_INST_FIELDS}
+    guard = " && ".join(f"{slices[f]} == {_field_literal(f, v)}" for f, v in cg["guard"].items())
+    iff = f" iff ({guard})" if guard else ""
+
+    count = 0
+    with open(output_sv, "w") as f:
+        f.write(f"covergroup {cg_name} with function sample(bit [31:0] instr);\n")
+        f.write("    // generated by gen_v_inst.py: 与 all_v_inst_fcov.sv 的 wildcard bins 一一对应\n")
+        for name, values in cg["points"].items():
+            f.write(f"\n    cp_{name}: coverpoint {slices[name]}{iff} {{\n")
+            f.write("        option.weight = 0;\n")
+            for v in values:
+                f.write(f"        bins {_field_bin(name, v)} = {{{_field_literal(name, v)}}};\n")
+            f.write("    }\n")
+
+        for cross in cg["crosses"]:
+            key = cross["fields"]
+            f.write(f"\n    cx_{'_'.join(key)}: cross {', '.join('cp_' + k for k in key)} {{\n")
+            for name, values in cross["bins"]:
+                sel = " && ".join(f"binsof(cp_{k}.{_field_bin(k, v)})" for k, v in zip(key, values))
+                f.write(f"        bins {name} = {sel};\n")
+                count += 1
+            for n, (prefix, field, legal) in enumerate(cross["ignore"]):
+                terms = [f"binsof(cp_{k}.{_field_bin(k, v)})" for k, v in prefix]
+                legal_values = ", ".join(_field_literal(field, v) for v in sorted(legal))
+                terms.append(f"!binsof(cp_{field}) intersect {{{legal_values}}}")
+                f.write(f"        ignore_bins illegal_{n} = {' && '.join(terms)};\n")
+            f.write("    }\n")
+
+        if cg["flat"]:
+            f.write("\n    cp_flat: coverpoint instr {\n")
+            for name, val, mask in cg["flat"]:
+                code = "".join("?" if not mask >> b & 1 else str(val >> b & 1) for b in range(31, -1, -1))
+                f.write(f"        wildcard bins {name} = {{32'b{code}}};\n")
+                count += 1
+            f.write("    }\n")
+        f.write("endgroup\n")
+    print("generated: ", output_sv)
+    return count# }}}
+
+def gen_all_inst_cg(template_file, inst_records, output_sv, encoders=None):# {{{
+    """
+    all_v_inst_fcov.sv 的分层版本：按字段建 coverpoint，再 cross，
+    各具名 cross bin 与 wildcard bin 一一对应（build_hier_covergroup 中检查），返回 bin 数
+    """
+    if encoders is None:
+        with _stage("parse_templates"):
+            encoders = compile_templates(parse_wavedrom_adoc(template_file))
+    with _stage("covergroup") as st:
+        patterns = list(iter_inst_patterns(encoders, inst_records))
+        st["rows"] = write_hier_covergroup(build_hier_covergroup(patterns), output_sv)
+    return st["rows"]# }}}
+
+# 查找表按 (opcode, funct3) 分桶，桶号 = opcode << 3 | funct3
+MATCH_MASK_BUCKETS = 1 << 10
+_BUCKET_KEY_MASK = 0x7F | 0x7 << 12
+
+def _const_name(assembly):# {{{
+    """"vmerge/vmv_OPIVV" -> "VMERGE_VMV_OPIVV"，用于 MATCH_* / MASK_* 常量名"""
+    return re.sub(r"[^0-9A-Za-z]+", "_", assembly).strip("_").upper()# }}}
+
+def build_match_mask_table(patterns):# {{{
+    """
+    patterns: [ (assembly, val, mask), ... ]，返回：
+    {
+        "consts":  [ (常量名, assembly, match, mask), ... ]，与 patterns 同序，常量名重复时加 _<序号>，保证各不相同
+        "entries": [ consts 的下标, ... ]，按桶排列，桶内固定位多的在前（第一个匹配即为最具体的编码）
+        "index":   [ (start, end), ... ]，共 MATCH_MASK_BUCKETS 项，桶 b 的编码为 entries[start:end]
+    }
+    opcode / funct3 中有 ? 的编码放进它可能落入的每个桶
+    """
+    consts = []
+    used = set()
+    suffix = {}
+    for assembly, val, mask in patterns:
+        base = name = _const_name(assembly)
+        # 加了序号的名字也可能与别的 assembly 的常量名相同，取到没用过的为止
+        while name in used:
+            suffix[base] = suffix.get(base, 0) + 1
+            name = f"{base}_{suffix[base]}"
+        used.add(name)
+        consts.append((name, assembly, val, mask))
+
+    order = sorted(range(len(patterns)), key=lambda i: (-bin(patterns[i][2]).count("1"), i))
+    buckets = [[] for _ in range(MATCH_MASK_BUCKETS)]
+    for i in order:
+        _, val, mask = patterns[i]
+        # opcode / funct3 中不固定的位逐一取遍，固定的编码只落入一个桶
+        free = ~mask & _BUCKET_KEY_MASK
+        base = val & mask & _BUCKET_KEY_MASK
+        sub = free
+        while True:
+            word = base | sub
+            buckets[(word & 0x7F) << 3 | word >> 12 & 0x7].append(i)
+            if not sub:
+                break
+            sub = (sub - 1) & free
+
+    entries = []
+    index = []
+    for bucket in buckets:
+        index.append((len(entries), len(entries) + len(bucket)))
+        entries.extend(bucket)
+    return {"consts": consts, "entries": entries, "index": index}# }}}
+
+def write_match_mask_header(table, output_h):# {{{
+    """写出 C 头文件：MATCH_* / MASK_* 宏、V_INST_TABLE、按 (opcode, funct3) 直接索引的 V_INST_INDEX"""
+    guard = re.sub(r"[^0-9A-Za-z]", "_", os.path.basename(output_h)).upper()
+    consts = table["consts"]
+    with open(output_h, "w") as f:
+        f.write("/* generated by gen_v_inst.py, do not edit */\n")
+        f.write(f"#ifndef {guard}\n#define {guard}\n\n#include <stdint.h>\n\n")
+        for name, _, val, mask in consts:
+            f.write(f"#define MATCH_{name} 0x{val:08x}u\n")
+            f.write(f"#define MASK_{name} 0x{mask:08x}u\n")
+
+        f.write("\ntypedef struct {\n    uint32_t match;\n    uint32_t mask;\n    const char *name;\n} v_inst_entry_t;\n\n")
+        f.write("/* 按 (opcode, funct3) 分桶，桶内固定位多的在前，第一个匹配即为结果 */\n")
+        f.write("static const v_inst_entry_t V_INST_TABLE[] = {\n")
+        for i in table["entries"]:
+            name, assembly = consts[i][:2]
+            f.write(f"    {{MATCH_{name}, MASK_{name}, \"{assembly}\"}},\n")
+        f.write("};\n\n")
+        f.write("/* V_INST_INDEX[opcode << 3 | funct3] = {start, end}: V_INST_TABLE[start, end) */\n")
+        f.write(f"static const uint32_t V_INST_INDEX[{MATCH_MASK_BUCKETS}][2] = {{\n")
+        for start, end in table["index"]:
+            f.write(f"    {{{start}, {end}}},\n")
+        f.write("};\n\n")
+        f.write("/* 返回 V_INST_TABLE 的下标，未知指令返回 -1 */\n")
+        f.write("static inline int v_inst_lookup(uint32_t insn)\n{\n"
+                "    const uint32_t *r = V_INST_INDEX[(insn & 0x7f) << 3 | ((insn >> 12) & 0x7)];\n"
+                "    for (uint32_t i = r[0]; i < r[1]; i++)\n"
+                "        if ((insn & V_INST_TABLE[i].mask) == V_INST_TABLE[i].match)\n"
+                "            return (int)i;\n"
+                "    return -1;\n}\n\n")
+        f.write(f"#endif /* {guard} */\n")
+    print("generated: ", output_h)# }}}
+
+def write_match_mask_module(table, output_py):# {{{
+    """写出 Python 模块：MATCH_* / MASK_* 常量、TABLE、INDEX 以及 lookup()"""
+    consts = table["consts"]
+    with open(output_py, "w") as f:
+        f.write("# coding=utf-8\n# generated by gen_v_inst.py, do not edit\n\n")
+        for name, _, val, mask in consts:
+            f.write(f"MATCH_{name} = 0x{val:08x}\n")
+            f.write(f"MASK_{name} = 0x{mask:08x}\n")
+        f.write("\n# (match, mask, name)，按 (opcode, funct3) 分桶，桶内固定位多的在前\nTABLE = [\n")
+        for i in table["entries"]:
+            name, assembly = consts[i][:2]
+            f.write(f"    (MATCH_{name}, MASK_{name}, {assembly!r}),\n")
+        f.write("]\n\n# INDEX[opcode << 3 | funct3] = (start, end): TABLE[start:end]\n")
+        f.write(f"INDEX = {table['index']!r}\n\n")
+        f.write("def lookup(insn):\n"
+                "    \"\"\"返回指令名，未知指令返回 None\"\"\"\n"
+                "    start, end = INDEX[(insn & 0x7f) << 3 | (insn >> 12 & 0x7)]\n"
+                "    for match, mask, name in TABLE[start:end]:\n"
+                "        if insn & mask == match:\n"
+                "            return name\n"
+                "    return None\n")
+    print("generated: ", output_py)# }}}
+
+def gen_all_inst_match_mask(template_file, inst_records, output_h, output_py, encoders=None):# {{{
+    """把所有指令的编码导出成 C 头文件和 Python 模块（MATCH_* / MASK_* 与查找表），返回指令数"""
+    if encoders is None:
+        with _stage("parse_templates"):
+            encoders = compile_templates(parse_wavedrom_adoc(template_file))
+    with _stage("match_mask") as st:
+        table = build_match_mask_table(list(iter_inst_patterns(encoders, inst_records)))
+        write_match_mask_header(table, output_h)
+        write_match_mask_module(table, output_py)
+        st["rows"] = len(table["consts"])
+    return st["rows"]# }}}
+
+def _file_sha256(path):# {{{
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()# }}}
+
+class JsonlRecords:# {{{
+    """
+    JSON Lines 文件中的记录表，每次迭代都从头逐行读取，不整表载入内存
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def __iter__(self):
+        with open(self.path) as f:
+            for line in f:
+                yield json.loads(line)# }}}
+
+class StageDag:# {{{
+    """
+    make 式的阶段 DAG：
+    - add() 声明阶段的函数、输入文件、上游阶段和输出文件，
+      func(*输入文件, *上游阶段结果) 返回记录表（列表、生成器或 DataFrame）
+    - 阶段 key = hash(本脚本 + 阶段名 + 输入文件内容 + 上游阶段 key)；
+      manifest 按阶段、也按每个输出文件记录写出时的 key，
+      阶段 key 一致且每个输出文件都在、记录的 key 也一致时才跳过该阶段
+      （例如 --sv-only 跑过新输入后，旧的表格文件会被当作过期重新生成）
+    - 有下游的阶段把结果逐条写入 JSON Lines 缓存，下游拿到的是可重复迭代的
+      JsonlRecords，所以生成器可以一路流下去，内存占用与表大小无关
+    - 被跳过的阶段只有在下游需要重跑时才读它的缓存
+    - 阶段真正运行后以最终结果调用 on_result（例如交给后台写表格）
+    - 全部输出写完后调用 save_manifest()
+    """
+    def __init__(self, out_dir, force=False):
+        self.out_dir = out_dir
+        self.force = force
+        self.stages = {}
+        self._keys = {}
+        self._results = {}
+        self._manifest_file = os.path.join(out_dir, STAGE_MANIFEST)
+        self._script_hash = _file_sha256(os.path.abspath(__file__))
+        # {"stages": {阶段名: key}, "outputs": {相对 out_dir 的输出路径: key}}
+        try:
+            with open(self._manifest_file) as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = None
+        if not (isinstance(self.manifest, dict) and isinstance(self.manifest.get("stages"), dict)
+                and isinstance(self.manifest.get("outputs"), dict)):
+            self.manifest = {"stages": {}, "outputs": {}}
+
+    def add(self, name, func, inputs=(), deps=(), outputs=(), on_result=None):
+        self.stages[name] = {"func": func, "inputs": list(inputs),
+                             "deps": list(deps), "outputs": list(outputs),
+                             "on_result": on_result}
+
+    def key(self, name):
+        if name not in self._keys:
+            st = self.stages[name]
+            h = hashlib.sha256()
+            h.update(self._script_hash.encode())
+            h.update(name.encode())
+            for path in st["inputs"]:
+                h.update(_file_sha256(path).encode())
+            for dep in st["deps"]:
+                h.update(self.key(dep).encode())
+            self._keys[name] = h.hexdigest()
+        return self._keys[name]
+
+    def _cache_file(self, name):
+        return os.path.join(self.out_dir, STAGE_CACHE_DIR, f"{name}.jsonl")
+
+    def _has_dependents(self, name):
+        return any(name in st["deps"] for st in self.stages.values())
+
+    def _outputs(self, name):
+        outputs = self.stages[name]["outputs"]
+        if self._has_dependents(name):
+            outputs = outputs + [self._cache_file(name)]
+        return outputs
+
+    def _output_id(self, path):
+        return os.path.relpath(os.path.abspath(path), os.path.abspath(self.out_dir))
+
+    def up_to_date(self, name):
+        key = self.key(name)
+        if self.force or self.manifest["stages"].get(name) != key:
+            return False
+        recorded = self.manifest["outputs"]
+        return all(os.path.exists(p) and recorded.get(self._output_id(p)) == key
+                   for p in self._outputs(name))
+
+    def result(self, name):
+        if name in self._results:
+            return self._results[name]
+
+        st = self.stages[name]
+        cache_file = self._cache_file(name)
+        if self.up_to_date(name):
+            records = JsonlRecords(cache_file)
+        else:
+            dep_results = [self.result(dep) for dep in st["deps"]]
+            with _stage("stage:" + name) as metric:
+                records = st["func"](*st["inputs"], *dep_results)
+                if isinstance(records, int):
+                    metric["rows"] = records
+                elif hasattr(records, "to_dict"):
+                    metric["rows"] = len(records)
+                if self._has_dependents(name):
+                    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+                    if hasattr(records, "to_dict"):
+                        records = records.to_dict("records")
+                    metric["rows"] = 0
+                    tmp = cache_file + ".tmp"
+                    with open(tmp, "w") as f:
+                        for row in records:
+                            f.write(json.dumps(row) + "\n")
+                            metric["rows"] += 1
+                    os.replace(tmp, cache_file)
+                    records = JsonlRecords(cache_file)
+            if st["on_result"]:
+                st["on_result"](records)
+            key = self.key(name)
+            self.manifest["stages"][name] = key
+            for p in self._outputs(name):
+                self.manifest["outputs"][self._output_id(p)] = key
+        self._results[name] = records
+        return records
+
+    def run(self, targets):
+        for name in targets:
+            if self.up_to_date(name):
+                print(f"up to date: {name}")
             else:
-                raise ValueError(f"No matching template found for funct3={funct3}")
-            
-            codes.append(code)
+                self.result(name)
 
-            # 写入 fcov 文件
-            assembly = row.get("assembly", "").strip()
-            f_fcov.write(f"wildcard {assembly} = {{{code}}};\n")
+    def save_manifest(self):
+        tmp = self._manifest_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmp, self._manifest_file)# }}}
 
-    df["code"] = codes
-    df.to_excel(output_excel, index=False)
-    print("generated: ", output_excel)
-    print("generated: ", output_fcov)# }}}
+DEFAULT_OUT_DIR = "generated_v_inst"
 
-if __name__ == "__main__":
-    if len(sys.argv) < 4:
-        print(f"Usage: {sys.argv[0]} funct6_funct3.adoc vs1_vs2.adoc op_format.adoc")
-        sys.exit(1)
+def run_pipeline(funct6_funct3_adoc, vs1_vs2_adoc, op_format_adoc, out_dir=DEFAULT_OUT_DIR,# {{{
+                 sv_only=False, code_formats=("xlsx",), force=False, encoders=None,
+                 covergroup=False, match_mask=False):
+    """
+    完整流程：adoc -> 记录表 -> 编码 -> fcov（以及可选的表格文件），全部写入 out_dir；
+    encoders: 已编译的 op_format 模板，批量模式下多个配置共用；
+    covergroup: 同时写出分层 covergroup all_v_inst_cg.sv（见 build_hier_covergroup）；
+    match_mask: 同时写出 MATCH_* / MASK_* 常量和查找表 v_inst_encoding.h / v_inst_encoding.py
+    """
+    os.makedirs(out_dir, exist_ok=True)
 
-    os.makedirs("generated_v_inst", exist_ok=True)
+    # 各阶段之间直接传递记录表，表格文件交给后台线程写出
+    writer = None if sv_only else TableWriter()
+    code_formats = [] if sv_only else list(code_formats)
+    for fmt in code_formats:
+        if fmt not in TABLE_FORMATS:
+            raise ValueError(f"Unknown table format: {fmt}")
 
-    funct6_funct3_adoc = sys.argv[1]
-    funct6_funct3_inst_xlsx = os.path.join("generated_v_inst", "funct6_funct3_inst.xlsx")
-    gen_funct6_funct3_inst(funct6_funct3_adoc, funct6_funct3_inst_xlsx)
+    def table_outputs(*names):
+        return [] if writer is None else [os.path.join(out_dir, n) for n in names]
 
+    def submit(*names, columns=INST_COLUMNS):
+        if writer is None:
+            return None
+        def on_result(records):
+            for n in names:
+                writer.submit(records, os.path.join(out_dir, n), columns)
+        return on_result
 
-    vs1_vs2_adoc = sys.argv[2]
-    vs1_vs2_inst_xlsx = os.path.join("generated_v_inst", "vs1_vs2_inst.xlsx")
-    gen_vs1_vs2_inst(vs1_vs2_adoc, funct6_funct3_inst_xlsx, vs1_vs2_inst_xlsx)
+    all_v_inst_fcov = os.path.join(out_dir, "all_v_inst_fcov.sv")
+    code_tables = [f"all_v_inst_code.{fmt}" for fmt in code_formats]
 
-    all_v_inst_xlsx = os.path.join("generated_v_inst", "all_v_inst.xlsx")
-    merge_all_inst(funct6_funct3_inst_xlsx, vs1_vs2_inst_xlsx, all_v_inst_xlsx)
+    def gen_code_fcov(adoc, records):
+        if writer is None:
+            return gen_all_inst_fcov(adoc, records, all_v_inst_fcov, encoders)
+        return gen_all_inst_code_fcov(adoc, records, None, all_v_inst_fcov, encoders)
 
+    dag = StageDag(out_dir, force=force)
+    dag.add("funct6_funct3_inst", iter_funct6_funct3_inst,
+            inputs=[funct6_funct3_adoc],
+            outputs=table_outputs("funct6_funct3_inst.xlsx"),
+            on_result=submit("funct6_funct3_inst.xlsx"))
+    dag.add("vs1_vs2_inst", iter_vs1_vs2_inst,
+            inputs=[vs1_vs2_adoc], deps=["funct6_funct3_inst"],
+            outputs=table_outputs("vs1_vs2_inst.xlsx"),
+            on_result=submit("vs1_vs2_inst.xlsx"))
+    dag.add("all_v_inst", iter_all_inst,
+            deps=["funct6_funct3_inst", "vs1_vs2_inst"],
+            outputs=table_outputs("all_v_inst.xlsx"),
+            on_result=submit("all_v_inst.xlsx"))
+    dag.add("all_v_inst_code_fcov", gen_code_fcov,
+            inputs=[op_format_adoc], deps=["all_v_inst"],
+            outputs=[all_v_inst_fcov] + table_outputs(*code_tables),
+            on_result=submit(*code_tables, columns=INST_COLUMNS + ["code"]))
 
-    op_format_adoc = sys.argv[3];
-    all_v_inst_xlsx_code_xlsx = os.path.join("generated_v_inst", "all_v_inst_code.xlsx");
-    all_v_inst_fcov = os.path.join("generated_v_inst", "all_v_inst_fcov.sv");
-    gen_all_inst_code_fcov(op_format_adoc, all_v_inst_xlsx, all_v_inst_xlsx_code_xlsx, all_v_inst_fcov)
+    targets = ["funct6_funct3_inst", "vs1_vs2_inst", "all_v_inst", "all_v_inst_code_fcov"]
+    if match_mask:
+        encoding_h = os.path.join(out_dir, "v_inst_encoding.h")
+        encoding_py = os.path.join(out_dir, "v_inst_encoding.py")
+
+        def gen_match_mask(adoc, records):
+            return gen_all_inst_match_mask(adoc, records, encoding_h, encoding_py, encoders)
+
+        dag.add("v_inst_encoding", gen_match_mask,
+                inputs=[op_format_adoc], deps=["all_v_inst"], outputs=[encoding_h, encoding_py])
+        targets.append("v_inst_encoding")
+    if covergroup:
+        all_v_inst_cg = os.path.join(out_dir, "all_v_inst_cg.sv")
+
+        def gen_cg(adoc, records):
+            return gen_all_inst_cg(adoc, records, all_v_inst_cg, encoders)
+
+        dag.add("all_v_inst_cg", gen_cg,
+                inputs=[op_format_adoc], deps=["all_v_inst"], outputs=[all_v_inst_cg])
+        targets.append("all_v_inst_cg")
+
+    try:
+        dag.run(targets)
+    finally:
+        if writer:
+            writer.close()
+    dag.save_manifest()
+    return out_dir# }}}
+
+def load_batch_manifest(manifest_file, out_root=DEFAULT_OUT_DIR):# {{{
+    """
+    批量配置清单（JSON），相对路径以清单所在目录为基准：
+    [
+        {"name": "v1.0", "funct6_funct3": "v1.0/funct6_funct3.adoc",
+         "vs1_vs2": "v1.0/vs1_vs2.adoc", "op_format": "op_format.adoc",
+         "out_dir": "可选，默认 <out_root>/<name>"},
+        ...
+    ]
+    返回 run_pipeline 的参数字典列表；name 或最终的输出目录重复时抛 ValueError
+    """
+    with open(manifest_file) as f:
+        variants = json.load(f)
+    base = os.path.dirname(os.path.abspath(manifest_file))
+
+    jobs = []
+    names = set()
+    out_dirs = {}
+    for v in variants:
+        name = v["name"]
+        if name in names:
+            raise ValueError(f"{manifest_file}: duplicate variant name {name}")
+        names.add(name)
+        out_dir = os.path.join(base, v["out_dir"]) if "out_dir" in v else os.path.join(out_root, name)
+        # 两个配置写同一目录会在子进程里互相覆盖 fcov 和阶段缓存
+        real = os.path.realpath(out_dir)
+        if real in out_dirs:
+            raise ValueError(f"{manifest_file}: variants {out_dirs[real]} and {name} "
+                             f"share out_dir {out_dir}")
+        out_dirs[real] = name
+        jobs.append({
+            "funct6_funct3_adoc": os.path.join(base, v["funct6_funct3"]),
+            "vs1_vs2_adoc": os.path.join(base, v["vs1_vs2"]),
+            "op_format_adoc": os.path.join(base, v["op_format"]),
+            "out_dir": out_dir,
+        })
+    return jobs# }}}
+
+def _run_pipeline_job(kwargs, collect_metrics=False):# {{{
+    """子进程入口；collect_metrics 时在子进程内单独统计，连同输出目录一起返回"""
+    # fork 出来的子进程继承了主进程的统计对象，丢弃重来
+    stage_metrics.stop()
+    if collect_metrics:
+        stage_metrics.start()
+    out_dir = run_pipeline(**kwargs)
+    return out_dir, (stage_metrics.METRICS.report() if collect_metrics else None)# }}}
+
+def run_batch(jobs, max_workers=None, **options):# {{{
+    """
+    jobs: load_batch_manifest 的结果；各配置在进程池中并行生成，互不共享输出目录；
+    相同内容的 op_format.adoc 只在主进程解析、编译一次，编译结果随任务传给子进程
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    compiled = {}
+    tasks = []
+    for job in jobs:
+        digest = _file_sha256(job["op_format_adoc"])
+        if digest not in compiled:
+            compiled[digest] = compile_templates(parse_wavedrom_adoc(job["op_format_adoc"]))
+        tasks.append(dict(job, encoders=compiled[digest], **options))
+
+    collect = stage_metrics.METRICS is not None
+    with ProcessPoolExecutor(max_workers=max_workers) as pool, _stage("batch") as st:
+        results = list(pool.map(_run_pipeline_job, tasks, [collect] * len(tasks)))
+        st["rows"] = len(results)
+    if collect:
+        stage_metrics.METRICS.jobs = [dict(out_dir=out_dir, **report) for out_dir, report in results]
+    return [out_dir for out_dir, _ in results]# }}}
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="生成向量指令编码、功能覆盖率")
+    parser.add_argument("funct6_funct3_adoc", nargs="?")
+    parser.add_argument("vs1_vs2_adoc", nargs="?")
+    parser.add_argument("op_format_adoc", nargs="?")
+    parser.add_argument("-o", "--out-dir", default=DEFAULT_OUT_DIR,
+                        help="输出目录（默认 %(default)s）；批量模式下为各配置子目录的根目录")
+    parser.add_argument("--sv-only", "--no-xlsx", dest="sv_only", action="store_true",
+                        help="只生成 fcov，不写 xlsx，全程只用标准库（不 import pandas）")
+    parser.add_argument("--force", action="store_true", help="忽略阶段缓存，全部重新生成")
+    parser.add_argument("--code-formats", default="xlsx",
+                        help="all_v_inst_code 的输出格式，逗号分隔，可选 "
+                             + "/".join(TABLE_FORMATS) + "（默认 %(default)s）")
+    parser.add_argument("--covergroup", action="store_true",
+                        help="同时生成分层 covergroup all_v_inst_cg.sv（coverpoint + cross，与 fcov 的 bins 一一对应）")
+    parser.add_argument("--match-mask", action="store_true",
+                        help="同时导出 MATCH_* / MASK_* 常量与查找表（v_inst_encoding.h / v_inst_encoding.py）")
+    parser.add_argument("--batch", metavar="MANIFEST",
+                        help="批量模式：按 JSON 清单并行生成多个配置（见 load_batch_manifest）")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="批量模式的进程数（默认 CPU 核数）")
+    parser.add_argument("--metrics", metavar="OUT_JSON",
+                        help="把各阶段的 wall / CPU 时间、内存峰值、行数写成 JSON（开启 tracemalloc，会变慢）")
+    parser.add_argument("--profile", metavar="OUT_PROF",
+                        help="用 cProfile 运行并把统计写到该文件（可用 python -m pstats / snakeviz 查看）")
+    args = parser.parse_args()
+
+    code_formats = args.code_formats.split(",")
+    for fmt in code_formats:
+        if fmt not in TABLE_FORMATS:
+            parser.error(f"unknown format in --code-formats: {fmt}")
+    options = {"sv_only": args.sv_only, "code_formats": code_formats, "force": args.force,
+               "covergroup": args.covergroup, "match_mask": args.match_mask}
+
+    if not args.batch and not args.op_format_adoc:
+        parser.error("需要 funct6_funct3.adoc vs1_vs2.adoc op_format.adoc 三个文件，或 --batch MANIFEST")
+
+    if args.metrics:
+        stage_metrics.start()
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        if args.batch:
+            run_batch(load_batch_manifest(args.batch, args.out_dir), args.jobs, **options)
+        else:
+            run_pipeline(args.funct6_funct3_adoc, args.vs1_vs2_adoc, args.op_format_adoc,
+                         args.out_dir, **options)
+    finally:
+        if args.profile:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            print(f"generated: {args.profile}")
+        if args.metrics:
+            stage_metrics.METRICS.save(args.metrics)
+            print(f"generated: {args.metrics}")
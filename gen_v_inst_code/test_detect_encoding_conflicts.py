@@ -0,0 +1,123 @@
+# coding=utf-8
+import os
+import random
+import shutil
+import sys
+
+import pytest
+
+# detect_encoding_conflicts.py / bench_detect_encoding_conflicts.py 在仓库根目录
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import detect_encoding_conflicts as dec
+from bench_detect_encoding_conflicts import gen_synthetic
+
+def brute_force_pairs(patterns):# {{{
+    """逐对检查，作为各引擎的参照"""
+    return [(i, j)
+            for i, p in enumerate(patterns)
+            for j in range(i + 1, len(patterns))
+            if dec.conflict_mask_mask(p[0], p[1], patterns[j][0], patterns[j][1])]# }}}
+
+@pytest.fixture(scope="module")
+def synthetic(tmp_path_factory):# {{{
+    path = tmp_path_factory.mktemp("syn") / "syn_fcov.sv"
+    gen_synthetic(str(path), 1500, density=0.1, conflict_rate=0.02, seed=1)
+    return dec.load_patterns(str(path))# }}}
+
+@pytest.mark.parametrize("engine", dec.ENGINES)
+def test_engine_matches_brute_force(synthetic, engine):
+    expected = brute_force_pairs(synthetic)
+    assert expected
+    assert dec.find_conflict_pairs(synthetic, engine, mem_budget=1 << 16) == expected
+
+@pytest.mark.parametrize("engine", dec.ENGINES)
+@pytest.mark.parametrize("shard_mask", [dec.DEFAULT_SHARD_MASK, 0x80000001])
+def test_sharded_matches_brute_force(monkeypatch, synthetic, engine, shard_mask):
+    # 合成数据只有 1500 条，降低门槛让它走分片路径
+    monkeypatch.setattr(dec, "PARALLEL_MIN_PATTERNS", 0)
+    assert any(p[1] & shard_mask == shard_mask for p in synthetic)
+    assert any(p[1] & shard_mask != shard_mask for p in synthetic)
+    assert dec.find_conflict_pairs(synthetic, engine, jobs=2, shard_mask=shard_mask) \
+        == brute_force_pairs(synthetic)
+
+# ---------------------------------------------------------------- --index-db
+
+def _random_codes(rng, n, tag):# {{{
+    """n 条互不重叠的 '01?' 编码：高 8 位固定为 tag + 序号，其余位随机"""
+    codes = []
+    for i in range(n):
+        rest = "".join(rng.choice("01?") for _ in range(24))
+        codes.append(format(tag + i, "08b") + rest)
+    return codes# }}}
+
+def write_fcov(path, codes):# {{{
+    with open(path, "w") as f:
+        for i, code in enumerate(codes):
+            f.write(f"wildcard bin_{i} = {{32'b{code}}};\n")# }}}
+
+def _pair_set(conflicts):# {{{
+    """忽略每对的先后顺序（增量模式把已接受的 pattern 放在前面）"""
+    return {frozenset(pair) for pair in conflicts}# }}}
+
+def test_incremental_matches_multi(tmp_path, monkeypatch):
+    rng = random.Random(0)
+    src = tmp_path / "fcov"
+    src.mkdir()
+    db = str(tmp_path / "index.pkl")
+    a, b, c = (_random_codes(rng, 30, tag) for tag in (0, 40, 80))
+    write_fcov(src / "a_fcov.sv", a)
+    write_fcov(src / "b_fcov.sv", b)
+    write_fcov(src / "c_fcov.sv", c)
+
+    scanned = []
+    scan_files = dec.scan_files
+    def record_scan(files, jobs=None):
+        scanned.append(list(files))
+        return scan_files(files, jobs)
+    monkeypatch.setattr(dec, "scan_files", record_scan)
+
+    def check():
+        conflicts = dec.detect_conflicts_incremental([str(src)], db, jobs=1)
+        assert _pair_set(conflicts) == _pair_set(dec.detect_conflicts_multi([str(src)], jobs=1))
+        return conflicts
+
+    # 冷启动：全部接受
+    assert check() == []
+    assert os.path.exists(db)
+
+    # 无改动：文件不重新读取
+    scanned.clear()
+    assert check() == []
+    assert scanned[0] == []
+
+    # 新文件里有一条与 a 重复：报冲突，索引不更新，再跑仍然报
+    write_fcov(src / "d_fcov.sv", [a[3]] + _random_codes(rng, 5, 120))
+    conflicts = check()
+    assert len(conflicts) == 1
+    assert check() == conflicts
+
+    # 去掉重复后接受
+    write_fcov(src / "d_fcov.sv", _random_codes(rng, 5, 120))
+    assert check() == []
+
+    # 改名：旧路径的 pattern 先移除，不与自己冲突
+    os.rename(src / "b_fcov.sv", src / "e_fcov.sv")
+    assert check() == []
+
+    # 复制：每条都与原文件冲突
+    shutil.copy(src / "c_fcov.sv", src / "f_fcov.sv")
+    assert len(check()) == len(c)
+
+def test_incremental_cold_run_builds_trie(tmp_path, monkeypatch):
+    """冷启动一次性建 trie，而不是逐条插入同一个越来越大的叶子（O(n^2)）"""
+    fcov = tmp_path / "syn_fcov.sv"
+    gen_synthetic(str(fcov), 3000, density=0.3, conflict_rate=0, seed=2)
+    db = str(tmp_path / "index.pkl")
+
+    inserts = []
+    monkeypatch.setattr(dec, "index_insert", lambda index, patterns, i: inserts.append(i))
+    assert dec.detect_conflicts_incremental([str(fcov)], db, jobs=1) == []
+    assert inserts == []
+
+    index = dec.load_index_db(db)["index"]
+    assert not isinstance(index, list)
@@ -0,0 +1,105 @@
+# coding=utf-8
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import pytest
+
+import gen_v_inst
+from bench_gen_v_inst import scale_funct6_funct3
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ADOCS = ("funct6_funct3.adoc", "vs1_vs2.adoc", "op_format.adoc")
+ALL_STAGES = {"funct6_funct3_inst", "vs1_vs2_inst", "all_v_inst", "all_v_inst_code_fcov"}
+
+@pytest.fixture
+def workdir(tmp_path):# {{{
+    for name in ADOCS:
+        shutil.copy(os.path.join(HERE, name), tmp_path / name)
+    return tmp_path# }}}
+
+def run(workdir, **options):# {{{
+    """运行一次流程，返回真正运行了的阶段名"""
+    metrics = gen_v_inst.stage_metrics.start(trace_memory=False)
+    try:
+        gen_v_inst.run_pipeline(*(str(workdir / name) for name in ADOCS),
+                                str(workdir / "out"), **options)
+    finally:
+        gen_v_inst.stage_metrics.stop()
+    return {name[len("stage:"):] for name in metrics.stages if name.startswith("stage:")}# }}}
+
+def test_rerun_is_noop(workdir):
+    assert run(workdir) == ALL_STAGES
+    assert run(workdir) == set()
+
+def test_op_format_edit_reruns_last_stage(workdir):
+    run(workdir)
+    with open(workdir / "op_format.adoc", "a") as f:
+        f.write("\n")
+    assert run(workdir) == {"all_v_inst_code_fcov"}
+
+def test_sv_only_then_full_regenerates_tables(workdir):
+    """--sv-only 跑过新输入后，上一次的表格文件已过期，完整运行时要重新生成"""
+    import pandas as pd
+
+    run(workdir)
+    rows = len(pd.read_excel(workdir / "out" / "funct6_funct3_inst.xlsx"))
+
+    scale_funct6_funct3(os.path.join(HERE, "funct6_funct3.adoc"), workdir / "funct6_funct3.adoc", 2)
+    assert run(workdir, sv_only=True) == ALL_STAGES
+    assert run(workdir) == ALL_STAGES
+    assert len(pd.read_excel(workdir / "out" / "funct6_funct3_inst.xlsx")) == 2 * rows
+    assert run(workdir) == set()
+
+def test_deleted_output_reruns_its_stage(workdir):
+    run(workdir)
+    os.remove(workdir / "out" / "all_v_inst.xlsx")
+    assert run(workdir) == {"all_v_inst"}
+    assert os.path.exists(workdir / "out" / "all_v_inst.xlsx")
+
+def test_match_mask_names_unique():
+    """去重加的序号不能与另一条 assembly 本身的常量名相撞"""
+    patterns = [("vfoo_OPIVV", 0, 0), ("vfoo/OPIVV", 1, 0), ("vfoo_OPIVV_1", 2, 0)]
+    names = [c[0] for c in gen_v_inst.build_match_mask_table(patterns)["consts"]]
+    assert names == ["VFOO_OPIVV", "VFOO_OPIVV_1", "VFOO_OPIVV_1_1"]
+
+# README 中的启动预算：--sv-only 新增的 import 不超过 50 ms，整次运行比空解释器多出的时间不超过 100 ms
+IMPORT_BUDGET_S = 0.05
+STARTUP_BUDGET_S = 0.1
+HEAVY_MODULES = ("pandas", "openpyxl", "numpy")
+
+def _imported(importtime_log):# {{{
+    """-X importtime 的 stderr -> {模块名: 自身耗时（秒）}"""
+    modules = {}
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(self_us) / 1e6
+    return modules# }}}
+
+def _min_wall(argv, repeat=5):# {{{
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run(argv, check=True, stdout=subprocess.DEVNULL)
+        wall = time.perf_counter() - t0
+        best = wall if best is None else min(best, wall)
+    return best# }}}
+
+def test_sv_only_startup_budget(workdir):
+    argv = [sys.executable, os.path.join(HERE, "gen_v_inst.py"),
+            *(str(workdir / name) for name in ADOCS), "-o", str(workdir / "out"), "--sv-only"]
+    bare = [sys.executable, "-c", "pass"]
+
+    log = subprocess.run([argv[0], "-X", "importtime", *argv[1:], "--force"], check=True,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True).stderr
+    modules = _imported(log)
+    baseline = _imported(subprocess.run([bare[0], "-X", "importtime", *bare[1:]], check=True,
+                                        stderr=subprocess.PIPE, text=True).stderr)
+    assert not [m for m in modules if m.split(".")[0] in HEAVY_MODULES]
+    assert sum(t for m, t in modules.items() if m not in baseline) < IMPORT_BUDGET_S
+
+    assert _min_wall(argv + ["--force"]) - _min_wall(bare) < STARTUP_BUDGET_S
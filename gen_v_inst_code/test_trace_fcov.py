@@ -0,0 +1,19 @@
+# coding=utf-8
+import numpy as np
+import pytest
+
+from trace_fcov import iter_trace_words
+
+@pytest.mark.parametrize("size", [4002, 3])
+def test_truncated_bin_trace(tmp_path, capsys, size):
+    """二进制 trace 不是 4 字节整数倍时丢掉末尾不完整的字并给出警告，不抛异常"""
+    data = np.random.default_rng(0).integers(0, 256, size, dtype=np.uint8).tobytes()
+    trace = tmp_path / "trace.bin"
+    trace.write_bytes(data)
+
+    chunks = list(iter_trace_words(str(trace), "bin", chunk_words=256))
+    words = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.uint32)
+
+    assert len(words) == size // 4
+    assert words.tobytes() == data[:size // 4 * 4]
+    assert f"trailing {size % 4} bytes ignored" in capsys.readouterr().out
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""
+离线统计指令 trace 的功能覆盖率：按 all_v_inst_fcov.sv 中的 wildcard bins 计数，
+与 SV covergroup 采样同一串指令字得到的各 bin 命中次数相同（一个指令字会命中所有匹配的 bin）；
+trace 可以是每行一个十六进制指令字的文本，或小端 32 位的二进制文件，
+mmap 后按固定大小分块处理，内存占用与 trace 大小无关；需要 numpy
+"""
+import os
+import json
+import mmap
+
+from v_inst_decoder import InstDecoder, DirectDecoder, UNKNOWN_ID, DECODE_CHUNK_WORDS, load_fcov_patterns
+
+TRACE_FORMATS = ("auto", "hex", "bin")
+# 每行 8 个十六进制字符 + 换行
+_HEX_LINE_BYTES = 9
+_HEX_CHARS = b"0123456789abcdefABCDEFxX \t\r\n"
+
+def detect_trace_format(trace_file):# {{{
+    """开头 4 KiB 全是十六进制字符和空白时认为是文本 trace，否则按二进制处理"""
+    with open(trace_file, "rb") as f:
+        head = f.read(4096)
+    return "hex" if head and not head.translate(None, _HEX_CHARS) else "bin"# }}}
+
+def _parse_hex_chunk(chunk):# {{{
+    """chunk: 以换行结尾的若干整行，返回 uint32 数组；每行 8 个十六进制字符时走向量化路径"""
+    import numpy as np
+
+    if len(chunk) % _HEX_LINE_BYTES == 0:
+        lines = np.frombuffer(chunk, dtype=np.uint8).reshape(-1, _HEX_LINE_BYTES)
+        if (lines[:, 8] == ord("\n")).all():
+            nibbles = _HEX_LUT[lines[:, :8]]
+            if (nibbles < 16).all():
+                shifts = np.arange(28, -1, -4, dtype=np.uint32)
+                return (nibbles.astype(np.uint32) << shifts).sum(axis=1, dtype=np.uint32)
+    tokens = chunk.split()
+    return np.fromiter((int(t, 16) for t in tokens), dtype=np.uint32, count=len(tokens))# }}}
+
+def _make_hex_lut():# {{{
+    import numpy as np
+    lut = np.full(256, 255, dtype=np.uint8)
+    for i, c in enumerate(b"0123456789abcdef"):
+        lut[c] = i
+    for i, c in enumerate(b"ABCDEF"):
+        lut[c] = 10 + i
+    return lut# }}}
+
+_HEX_LUT = None
+
+def iter_trace_words(trace_file, fmt="auto", chunk_words=DECODE_CHUNK_WORDS):# {{{
+    """
+    mmap trace 文件，每次 yield 不超过 chunk_words 个指令字的 uint32 数组；
+    fmt: "hex"（每行一个十六进制字，可带 0x）/ "bin"（小端 32 位）/ "auto"
+    """
+    import numpy as np
+    global _HEX_LUT
+
+    if fmt == "auto":
+        fmt = detect_trace_format(trace_file)
+    if fmt not in ("hex", "bin"):
+        raise ValueError(f"Unknown trace format: {fmt}")
+    if os.path.getsize(trace_file) == 0:
+        return
+
+    if fmt == "bin":
+        # 被中途杀掉的模拟器留下的 trace 可能不是 4 字节的整数倍，丢掉末尾不完整的字
+        size = os.path.getsize(trace_file)
+        if size % 4:
+            print(f"WARNING: {trace_file}: trailing {size % 4} bytes ignored")
+        if size < 4:
+            return
+        words = np.memmap(trace_file, dtype="<u4", mode="r", shape=(size // 4,))
+        for start in range(0, len(words), chunk_words):
+            yield np.array(words[start:start + chunk_words], dtype=np.uint32)
+        return
+
+    if _HEX_LUT is None:
+        _HEX_LUT = _make_hex_lut()
+    chunk_bytes = chunk_words * _HEX_LINE_BYTES
+    with open(trace_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm)
+        pos = 0
+        while pos < size:
+            end = min(pos + chunk_bytes, size)
+            if end < size:
+                # 块在整行处结束；一行比整块还长时延伸到该行结尾
+                nl = mm.rfind(b"\n", pos, end)
+                if nl < 0:
+                    nl = mm.find(b"\n", end)
+                end = size if nl < 0 else nl + 1
+            chunk = mm[pos:end]
+            pos = end
+            if not chunk.endswith(b"\n"):
+                chunk += b"\n"
+            words = _parse_hex_chunk(chunk)
+            if len(words):
+                yield words# }}}
+
+class TraceCoverage:# {{{
+    """
+    按 bin 统计命中次数：每个指令字先由 decoder（InstDecoder / DirectDecoder）译出最具体的 bin i，
+    再计入所有包含 bin i 的 bin（supersets[i]，必然同时命中）；
+    与 i 部分重叠的 bin（partials[i]）对落到 i 的指令字逐个比较
+    """
+    def __init__(self, decoder):
+        import numpy as np
+
+        self.decoder = decoder
+        n = len(decoder.patterns)
+        vals = np.array([p[1] for p in decoder.patterns], dtype=np.uint32)
+        masks = np.array([p[2] for p in decoder.patterns], dtype=np.uint32)
+        rank = np.array(decoder.rank)
+        self.supersets = []
+        self.partials = {}
+        for i in range(n):
+            overlap = (vals[i] & masks) == (vals & masks[i])
+            sup = overlap & ((masks & ~masks[i]) == 0)
+            self.supersets.append(np.flatnonzero(sup))
+            # 比 i 更具体的 bin 若命中，译码结果就不会是 i，不需要检查
+            partial = np.flatnonzero(overlap & ~sup & (rank > rank[i]))
+            if len(partial):
+                self.partials[i] = (partial, vals[partial], masks[partial])
+
+        self.specific = np.zeros(n, dtype=np.int64)
+        self.extra = np.zeros(n, dtype=np.int64)
+        self.words = 0
+        self.unknown = 0
+
+    def add_words(self, words):
+        import numpy as np
+
+        ids = self.decoder.decode_array(words)
+        known = ids != UNKNOWN_ID
+        self.words += len(ids)
+        self.unknown += len(ids) - int(np.count_nonzero(known))
+        counts = np.bincount(ids[known], minlength=len(self.specific))
+        self.specific += counts
+        for i in np.flatnonzero(counts).tolist():
+            if i in self.partials:
+                partial, vals, masks = self.partials[i]
+                sel = words[ids == i]
+                self.extra[partial] += ((sel[:, None] & masks) == vals).sum(axis=0)
+
+    def hits(self):
+        """各 bin 的命中次数（与 decoder.patterns 同序）"""
+        hits = self.extra.copy()
+        for i in self.specific.nonzero()[0].tolist():
+            hits[self.supersets[i]] += self.specific[i]
+        return hits
+
+    def report(self):
+        hits = self.hits()
+        bins = [{"name": name, "hits": int(h)} for name, h in zip(self.decoder.names, hits)]
+        covered = sum(1 for b in bins if b["hits"])
+        return {
+            "words": self.words,
+            "unknown_words": self.unknown,
+            "bins": len(bins),
+            "covered_bins": covered,
+            "coverage": covered / len(bins) if bins else 0.0,
+            "hits": bins,
+        }# }}}
+
+def trace_coverage(fcov_file, trace_files, fmt="auto", chunk_words=DECODE_CHUNK_WORDS):# {{{
+    """对若干 trace 文件累计覆盖率，返回 TraceCoverage.report()"""
+    patterns = load_fcov_patterns(fcov_file)
+    try:
+        decoder = DirectDecoder(patterns)
+    except ValueError:
+        # 区分位太多、平坦表放不下时退回决策树
+        decoder = InstDecoder(patterns)
+    cov = TraceCoverage(decoder)
+    for trace_file in trace_files:
+        for words in iter_trace_words(trace_file, fmt, chunk_words):
+            cov.add_words(words)
+    return cov.report()# }}}
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="按 fcov 的 wildcard bins 离线统计指令 trace 的覆盖率")
+    parser.add_argument("fcov_file", help="all_v_inst_fcov.sv")
+    parser.add_argument("traces", nargs="+", help="trace 文件，多个文件累计统计")
+    parser.add_argument("--format", choices=TRACE_FORMATS, default="auto",
+                        help="hex: 每行一个十六进制指令字；bin: 小端 32 位二进制（默认按内容判断）")
+    parser.add_argument("--chunk-words", type=int, default=DECODE_CHUNK_WORDS,
+                        help="每块处理的指令字数（默认 %(default)s）")
+    parser.add_argument("--show", choices=("all", "hit", "miss", "none"), default="all",
+                        help="列出哪些 bin（默认 %(default)s）")
+    parser.add_argument("-o", "--output", help="把完整结果写成 JSON")
+    args = parser.parse_args()
+
+    report = trace_coverage(args.fcov_file, args.traces, args.format, args.chunk_words)
+    for b in report["hits"]:
+        if (args.show == "all" or (args.show == "hit" and b["hits"])
+                or (args.show == "miss" and not b["hits"])):
+            print(f"{b['hits']:>12}  {b['name']}")
+    print(f"words: {report['words']}, unknown: {report['unknown_words']}, "
+          f"bins covered: {report['covered_bins']}/{report['bins']} ({report['coverage']:.1%})")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"generated: {args.output}")
@@ -0,0 +1,669 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""
+由生成 all_v_inst_fcov.sv 的同一组 wildcard 编码构造决策树译码器：
+32 位指令字 -> 指令名，先按所有候选编码都固定的位（opcode、funct3、funct6）查字典，
+再按 vs1 / vs2 子编码等逐层细分，叶子上只做一次（或几次）掩码比较
+    from v_inst_decoder import InstDecoder
+    dec = InstDecoder.from_fcov("generated_v_inst/all_v_inst_fcov.sv")
+    dec.decode(0x00000057)  # -> "vadd_OPIVV"
+DirectDecoder 则按主 opcode 分组，只取组内区分各编码所需的最少位直接索引一张平坦表，
+译码为一次查表加一次掩码比较
+"""
+import re
+import inspect
+
+# 没有公共固定位时，候选数不超过该值就不再细分，直接逐条比较
+DECODER_LEAF_SIZE = 4
+# decode_array 的未知指令 id
+UNKNOWN_ID = -1
+# decode_array 每块处理的指令字数，临时数组约为其 30 倍字节
+DECODE_CHUNK_WORDS = 1 << 20
+# 主 opcode 所在的位
+OPCODE_MASK = 0x7F
+# DirectDecoder 每组平坦表最多索引的位数（表长 2**n）
+DIRECT_MAX_TABLE_BITS = 20
+# 求区分位 / 建表时 (编码, 格) 项的总数上限：不固定的区分位越多，一个编码要放进的格越多
+DIRECT_MAX_ENTRIES = 1 << 20
+
+_FCOV_RE = re.compile(r"wildcard\s+(\S+)\s*=\s*\{32'b([01_?]+)\}")
+
+def parse_code(code):# {{{
+    """
+    "000000_?_?????_?????_000_?????_1010111"（可带 32'b 前缀）-> (val, mask)，
+    mask 为固定位（非 ?）
+    """
+    if code.startswith("32'b"):
+        code = code[4:]
+    bits = code.replace("_", "")
+    if len(bits) != 32:
+        raise ValueError(f"Invalid 32-bit code: {code}")
+    val = int(bits.replace("?", "0"), 2)
+    mask = int("".join("0" if b == "?" else "1" for b in bits), 2)
+    return val, mask# }}}
+
+def load_fcov_patterns(fcov_file):# {{{
+    """
+    读取 gen_all_inst_code_fcov / gen_all_inst_fcov 写出的 fcov 文件，按文件顺序返回：
+    [ (name, val, mask), ... ]
+    """
+    patterns = []
+    with open(fcov_file) as f:
+        for line in f:
+            m = _FCOV_RE.search(line)
+            if m:
+                patterns.append((m.group(1), *parse_code(m.group(2))))
+    return patterns# }}}
+
+def patterns_from_records(encoders, records):# {{{
+    """
+    encoders: gen_v_inst.compile_templates 的结果；records: 带 assembly 等列的记录表，
+    不经过 fcov 文件直接得到同样的 [ (name, val, mask), ... ]
+    """
+    # 与 MATCH/MASK 导出共用 gen_v_inst.iter_inst_patterns，两边对记录的编码方式不会分叉；
+    # 只在这里 import，trace_fcov / elf_vinst_scan 只读 fcov 时不需要它
+    from gen_v_inst import iter_inst_patterns
+    return list(iter_inst_patterns(encoders, records))# }}}
+
+def pattern_rank(patterns):# {{{
+    """多个编码同时匹配时的优先级：固定位多的在前，相同时按原顺序；返回每个编码的名次"""
+    order = sorted(range(len(patterns)), key=lambda i: (-bin(patterns[i][2]).count("1"), i))
+    rank = [0] * len(order)
+    for r, i in enumerate(order):
+        rank[i] = r
+    return rank# }}}
+
+def _build_tree(patterns, rank, ids, consumed):# {{{
+    """
+    内部节点: (mask, {word & mask: 子树}, fallback)，fallback 为不固定 mask 位的编码构成的子树或 None
+    叶子:     [ (val, mask, id), ... ]，按 rank 排序
+    树只由 int / tuple / list / dict / None 组成，repr() 即可写成 Python 字面量
+    """
+    common = consumed ^ 0xFFFFFFFF
+    for i in ids:
+        common &= patterns[i][2]
+
+    fallback = None
+    if not common:
+        if len(ids) <= DECODER_LEAF_SIZE:
+            return sorted(((patterns[i][1], patterns[i][2], i) for i in ids), key=lambda t: rank[t[2]])
+        # 取被最多编码固定的一位，固定了这些位的编码按字典分派，其余放进 fallback
+        counts = [0] * 32
+        for i in ids:
+            free = patterns[i][2] & ~consumed
+            for b in range(32):
+                if free >> b & 1:
+                    counts[b] += 1
+        best = max(range(32), key=lambda b: counts[b])
+        if not counts[best]:
+            # 剩余候选的固定位完全相同（重复编码），只能逐条比较
+            return sorted(((patterns[i][1], patterns[i][2], i) for i in ids), key=lambda t: rank[t[2]])
+        common = consumed ^ 0xFFFFFFFF
+        rest = []
+        fixed = []
+        for i in ids:
+            if patterns[i][2] >> best & 1:
+                common &= patterns[i][2]
+                fixed.append(i)
+            else:
+                rest.append(i)
+        fallback = _build_tree(patterns, rank, rest, consumed)
+        ids = fixed
+
+    groups = {}
+    for i in ids:
+        groups.setdefault(patterns[i][1] & common, []).append(i)
+    table = {key: _build_tree(patterns, rank, group, consumed | common)
+             for key, group in groups.items()}
+    return (common, table, fallback)# }}}
+
+def _lookup(node, word, rank):# {{{
+    """沿决策树查找 word，返回匹配编码中 rank 最小者的 id，没有匹配返回 None"""
+    while type(node) is tuple:
+        mask, table, fallback = node
+        child = table.get(word & mask)
+        if fallback is not None:
+            a = None if child is None else _lookup(child, word, rank)
+            b = _lookup(fallback, word, rank)
+            if a is None or (b is not None and rank[b] < rank[a]):
+                return b
+            return a
+        if child is None:
+            return None
+        node = child
+    for val, mask, i in node:
+        if word & mask == val:
+            return i
+    return None# }}}
+
+def _compile_array_node(node):# {{{
+    """
+    把决策树节点转成 _lookup_array 用的 numpy 数组：
+    叶子 -> ("leaf", vals, masks, ids)，按 rank 排序
+    内部节点 -> ("node", mask, keys, single_id, single_val, single_mask, children, fallback)，
+    keys 有序；只含一条编码的子树直接展开成 single_*（一次向量化比较即可），
+    其余子树放在 children {keys 下标: 子节点} 中递归
+    """
+    import numpy as np
+
+    if type(node) is list:
+        return ("leaf",
+                np.array([t[0] for t in node], dtype=np.uint32),
+                np.array([t[1] for t in node], dtype=np.uint32),
+                np.array([t[2] for t in node], dtype=np.int32))
+
+    mask, table, fallback = node
+    keys = sorted(table)
+    single_id = np.full(len(keys), UNKNOWN_ID, dtype=np.int32)
+    single_val = np.zeros(len(keys), dtype=np.uint32)
+    single_mask = np.zeros(len(keys), dtype=np.uint32)
+    children = {}
+    for pos, key in enumerate(keys):
+        child = table[key]
+        if type(child) is list and len(child) == 1:
+            single_val[pos], single_mask[pos], single_id[pos] = child[0]
+        else:
+            children[pos] = _compile_array_node(child)
+    return ("node", np.uint32(mask), np.array(keys, dtype=np.uint32),
+            single_id, single_val, single_mask, children,
+            None if fallback is None else _compile_array_node(fallback))# }}}
+
+def _lookup_array(node, words, rank):# {{{
+    """
+    _lookup 的 numpy 版本：node 为 _compile_array_node 的结果，words 为 uint32 数组，
+    返回同长度的 int32 id 数组（未知为 UNKNOWN_ID）；rank 为 int 数组
+    """
+    import numpy as np
+
+    ids = np.full(len(words), UNKNOWN_ID, dtype=np.int32)
+    if not len(words):
+        return ids
+    if node[0] == "leaf":
+        # 叶子按 rank 排序，倒序赋值使靠前（更具体）的编码最后写入
+        _, vals, masks, leaf_ids = node
+        for k in range(len(leaf_ids) - 1, -1, -1):
+            ids[(words & masks[k]) == vals[k]] = leaf_ids[k]
+        return ids
+
+    _, mask, keys, single_id, single_val, single_mask, children, fallback = node
+    key = words & mask
+    pos = np.searchsorted(keys, key)
+    np.minimum(pos, len(keys) - 1, out=pos)
+    hit = keys[pos] == key
+
+    cand = single_id[pos]
+    ok = hit & ((words & single_mask[pos]) == single_val[pos])
+    ids[ok] = cand[ok]
+
+    if children:
+        # 其余子树：按所属子树分组，每组递归一次
+        sel = np.flatnonzero(hit & (cand == UNKNOWN_ID))
+        if len(sel):
+            order = sel[np.argsort(pos[sel], kind="stable")]
+            group_pos = pos[order]
+            starts = np.flatnonzero(np.r_[True, group_pos[1:] != group_pos[:-1]])
+            ends = np.r_[starts[1:], len(order)]
+            for a, b in zip(starts.tolist(), ends.tolist()):
+                idx = order[a:b]
+                ids[idx] = _lookup_array(children[int(group_pos[a])], words[idx], rank)
+
+    if fallback is not None:
+        other = _lookup_array(fallback, words, rank)
+        better = (other != UNKNOWN_ID) & ((ids == UNKNOWN_ID) | (rank[other] < rank[ids]))
+        ids[better] = other[better]
+    return ids# }}}
+
+class InstDecoder:# {{{
+    """
+    patterns: [ (name, val, mask), ... ]；id 即 patterns 中的下标
+    多个编码同时匹配时（如 VXUNARY0_OPMVV 与其 vs1 子编码），取固定位最多的，
+    固定位数相同时取靠前的
+    """
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self.names = [p[0] for p in self.patterns]
+        self.rank = pattern_rank(self.patterns)
+        self.tree = _build_tree(self.patterns, self.rank, list(range(len(self.patterns))), 0)
+        # decode_array 首次调用时由 self.tree 转换
+        self._array_tree = None
+
+    @classmethod
+    def from_fcov(cls, fcov_file):
+        return cls(load_fcov_patterns(fcov_file))
+
+    def decode_id(self, word):
+        """返回指令 id，未知指令返回 None"""
+        return _lookup(self.tree, word, self.rank)
+
+    def decode(self, word):
+        """返回指令名，未知指令返回 None"""
+        i = _lookup(self.tree, word, self.rank)
+        return None if i is None else self.names[i]
+
+    def decode_all(self, words):
+        """逐个译码，返回指令名列表"""
+        tree, rank, names = self.tree, self.rank, self.names
+        result = []
+        for word in words:
+            i = _lookup(tree, word, rank)
+            result.append(None if i is None else names[i])
+        return result
+
+    def iter_decode_array(self, words, chunk_words=DECODE_CHUNK_WORDS):
+        """
+        words: uint32 数组（可以是 np.memmap）；每 chunk_words 个指令字 yield 一次 (起始下标, id 数组)，
+        临时内存只与 chunk_words 有关；需要 numpy
+        """
+        import numpy as np
+        if self._array_tree is None:
+            self._array_tree = (_compile_array_node(self.tree), np.array(self.rank, dtype=np.int64))
+        tree, rank = self._array_tree
+        words = np.asarray(words, dtype=np.uint32)
+        for start in range(0, len(words), chunk_words):
+            yield start, _lookup_array(tree, words[start:start + chunk_words], rank)
+
+    def decode_array(self, words, chunk_words=DECODE_CHUNK_WORDS):
+        """
+        批量译码：返回与 words 等长的 int32 id 数组，未知指令为 UNKNOWN_ID；
+        id 可用 self.names 转成指令名
+        """
+        import numpy as np
+        ids = np.empty(len(words), dtype=np.int32)
+        for start, chunk in self.iter_decode_array(words, chunk_words):
+            ids[start:start + len(chunk)] = chunk
+        return ids
+
+    def emit_python(self, output_file):
+        """
+        写出不依赖本模块的独立 Python 译码模块（NAMES / PATTERNS / decode / decode_id），
+        树以字面量形式嵌入，import 时不需要再解析 fcov 或建树
+        """
+        with open(output_file, "w") as f:
+            f.write("# coding=utf-8\n")
+            f.write("# generated by v_inst_decoder.py, do not edit\n\n")
+            f.write(f"NAMES = {self.names!r}\n\n")
+            f.write("# (name, val, mask)\n")
+            f.write(f"PATTERNS = {[(n, v, m) for n, v, m in self.patterns]!r}\n\n")
+            f.write(f"_RANK = {self.rank!r}\n\n")
+            f.write(f"_TREE = {self.tree!r}\n\n")
+            f.write(inspect.getsource(_lookup) + "\n")
+            f.write("def decode_id(word):\n"
+                    "    return _lookup(_TREE, word, _RANK)\n\n"
+                    "def decode(word):\n"
+                    "    i = _lookup(_TREE, word, _RANK)\n"
+                    "    return None if i is None else NAMES[i]\n")
+        print(f"generated: {output_file}")# }}}
+
+def _conflict_bits(patterns, ids):# {{{
+    """ids 中有编码固定为 0、也有编码固定为 1 的位，为 0 时 ids 两两重叠"""
+    fixed0 = fixed1 = 0
+    for i in ids:
+        _, val, mask = patterns[i]
+        fixed0 |= mask & ~val
+        fixed1 |= mask & val
+    return fixed0 & fixed1# }}}
+
+def _split_classes(patterns, classes, bit):# {{{
+    """
+    classes: [ [id, ...], ... ]，按 bit 切开同时含该位固定为 0 和固定为 1 的编码的类，
+    不固定该位的编码两边都放；已经两两重叠的类不会再被切分，直接丢掉，相同的类只留一个
+    """
+    result = set()
+    for ids in classes:
+        zero, one, free = [], [], []
+        for i in ids:
+            _, val, mask = patterns[i]
+            if not mask & bit:
+                free.append(i)
+            elif val & bit:
+                one.append(i)
+            else:
+                zero.append(i)
+        parts = (zero + free, one + free) if zero and one else (ids,)
+        for part in parts:
+            if _conflict_bits(patterns, part):
+                result.add(tuple(sorted(part)))
+    return list(result)# }}}
+
+def _refine(patterns, classes, order, max_entries):# {{{
+    """
+    把 classes 依次按 order 中的位切分，返回仍有冲突位的类；
+    类的项数总和超过 max_entries 时抛出 ValueError
+    """
+    classes = [c for c in classes if _conflict_bits(patterns, c)]
+    for bit in order:
+        if not classes:
+            break
+        classes = _split_classes(patterns, classes, bit)
+        if sum(len(c) for c in classes) > max_entries:
+            raise ValueError(f"discriminator classes exceed {max_entries} entries")
+    return classes# }}}
+
+def _slot_entries(patterns, ids, bits):# {{{
+    """按 bits 建表时 (编码, 格) 项的总数"""
+    return sum(1 << bin(~patterns[i][2] & bits).count("1") for i in ids)# }}}
+
+def _slot_fixed_bits(patterns, ids, bits):# {{{
+    """
+    按 bits 的取值把 ids 放进表格（不固定的位两种取值都放），
+    返回 {word & bits: (格内固定为 0 的位, 格内固定为 1 的位)}，只含非空的格
+    """
+    slots = {}
+    for i in ids:
+        _, val, mask = patterns[i]
+        free = ~mask & bits
+        base = val & mask & bits
+        sub = free
+        while True:
+            fixed0, fixed1 = slots.get(base | sub, (0, 0))
+            slots[base | sub] = (fixed0 | mask & ~val, fixed1 | mask & val)
+            if not sub:
+                break
+            sub = (sub - 1) & free
+    return slots# }}}
+
+def discriminator_bits(patterns, ids=None, max_bits=32, max_entries=DIRECT_MAX_ENTRIES):# {{{
+    """
+    找出一组位：任意两个不可能同时匹配的编码（某个双方都固定的位取值不同）在这组位中至少有一位不同，
+    即按这组位的取值查表时，同一格里只剩互相重叠的编码（如父编码与其 vs1 子编码）；
+    不枚举编码对，而是像建决策树一样逐位切分出“类”（可能落在同一格的编码）：
+    贪心地每次加入在各类中区分编码对最多的位
+    （类内固定为 0 与固定为 1 的编码数之积），直到每个类都两两重叠，
+    最后去掉多余的位，结果中任何一位都不能再去掉；返回位掩码
+    贪心选出的位超过 max_bits，或切分出的 (编码, 类) 项超过 max_entries 时抛出 ValueError
+    """
+    ids = list(range(len(patterns))) if ids is None else list(ids)
+    order = []
+    classes = _refine(patterns, [ids], [], max_entries)
+    while classes:
+        gains = [0] * 32
+        for c in classes:
+            conflict = _conflict_bits(patterns, c)
+            while conflict:
+                low = conflict & -conflict
+                conflict ^= low
+                ones = zeros = 0
+                for i in c:
+                    _, val, mask = patterns[i]
+                    if mask & low:
+                        if val & low:
+                            ones += 1
+                        else:
+                            zeros += 1
+                gains[low.bit_length() - 1] += ones * zeros
+        best = 1 << max(range(32), key=lambda b: gains[b])
+        order.append(best)
+        if len(order) > max_bits:
+            raise ValueError(f"more than {max_bits} discriminator bits needed")
+        classes = _refine(patterns, classes, [best], max_entries)
+
+    # 从最后选的位开始逐位试着去掉
+    bits = sum(order)
+    if _slot_entries(patterns, ids, bits) <= max_entries:
+        # 表放得下时直接建表：去掉一位相当于把只差这一位的两格合并，合并后仍没有冲突位即可去掉
+        slots = _slot_fixed_bits(patterns, ids, bits)
+        for bit in reversed(order):
+            merged = {}
+            for key, (fixed0, fixed1) in slots.items():
+                key &= ~bit
+                other0, other1 = merged.get(key, (0, 0))
+                fixed0 |= other0
+                fixed1 |= other1
+                if fixed0 & fixed1:
+                    break
+                merged[key] = (fixed0, fixed1)
+            else:
+                bits &= ~bit
+                slots = merged
+        return bits
+    # 不固定的位多、表放不下时改为按其余的位重新切分，没有冲突的类即可去掉
+    for bit in reversed(order[:]):
+        rest = [b for b in order if b != bit]
+        if not _refine(patterns, [ids], rest, max_entries):
+            order = rest
+    return sum(order)# }}}
+
+def _bit_runs(bits):# {{{
+    """位掩码 -> [(右移位数, 宽度掩码, 左移位数), ...]：按连续位段抽取，拼成紧凑的表下标（类似 pext）"""
+    runs = []
+    out = 0
+    b = 0
+    while b < 32:
+        if bits >> b & 1:
+            width = 0
+            while b + width < 32 and bits >> (b + width) & 1:
+                width += 1
+            runs.append((b, (1 << width) - 1, out))
+            out += width
+            b += width
+        else:
+            b += 1
+    return runs# }}}
+
+def _extract(word, runs):# {{{
+    index = 0
+    for shift, mask, out in runs:
+        index |= (word >> shift & mask) << out
+    return index# }}}
+
+def _extractor(runs):# {{{
+    """
+    返回 word -> 表下标的函数；常见的 1~3 段直接展开成闭包（逐条译码时比循环 runs 快），
+    更多段时按 runs 循环
+    """
+    if not runs:
+        return lambda w: 0
+    if len(runs) == 1:
+        (s0, m0, o0), = runs
+        return lambda w: (w >> s0 & m0) << o0
+    if len(runs) == 2:
+        (s0, m0, o0), (s1, m1, o1) = runs
+        return lambda w: (w >> s0 & m0) << o0 | (w >> s1 & m1) << o1
+    if len(runs) == 3:
+        (s0, m0, o0), (s1, m1, o1), (s2, m2, o2) = runs
+        return lambda w: (w >> s0 & m0) << o0 | (w >> s1 & m1) << o1 | (w >> s2 & m2) << o2
+    runs = tuple(runs)
+    return lambda w: _extract(w, runs)# }}}
+
+class DirectDecoder:# {{{
+    """
+    与 InstDecoder 结果相同的直接索引译码器：
+    按主 opcode（低 7 位）分组，每组由 discriminator_bits 求出区分组内编码的位，
+    以这些位的取值为下标建平坦表，每格是 ( (val, mask, id), ... )（按 rank 排序），
+    通常只有一项，查表后比较一次 word & mask == val 即可；
+    与之重叠、依赖更多位的编码（如父编码）跟在后面作为第二次比较
+    opcode 不完全固定的编码放进所有相容的组，另外在 other 中逐条比较（用于没有分组的 opcode）
+    """
+    def __init__(self, patterns, max_table_bits=DIRECT_MAX_TABLE_BITS):
+        self.patterns = list(patterns)
+        self.names = [p[0] for p in self.patterns]
+        self.rank = pattern_rank(self.patterns)
+
+        members = {}
+        other = []
+        for i, (_, val, mask) in enumerate(self.patterns):
+            if mask & OPCODE_MASK == OPCODE_MASK:
+                members.setdefault(val & OPCODE_MASK, []).append(i)
+            else:
+                other.append(i)
+        for i in other:
+            _, val, mask = self.patterns[i]
+            for opcode, ids in members.items():
+                if opcode & mask == val & OPCODE_MASK:
+                    ids.append(i)
+        self.other = sorted(((self.patterns[i][1], self.patterns[i][2], i) for i in other),
+                            key=lambda t: self.rank[t[2]])
+
+        # {opcode: (位掩码, 抽取段, 平坦表)}，_scalar_groups: {opcode: (抽取函数, 平坦表)}
+        self.groups = {}
+        for opcode, ids in sorted(members.items()):
+            ids.sort(key=lambda i: self.rank[i])
+            try:
+                bits = discriminator_bits(self.patterns, ids, max_table_bits) & ~OPCODE_MASK
+            except ValueError as e:
+                raise ValueError(f"opcode {opcode:07b}: {e}") from None
+            width = bin(bits).count("1")
+            if width > max_table_bits:
+                raise ValueError(f"opcode {opcode:07b}: {width} discriminator bits exceed "
+                                 f"max_table_bits={max_table_bits}")
+            if _slot_entries(self.patterns, ids, bits) > DIRECT_MAX_ENTRIES:
+                raise ValueError(f"opcode {opcode:07b}: table exceeds {DIRECT_MAX_ENTRIES} entries")
+            runs = _bit_runs(bits)
+            # 空格共用同一个空 tuple；ids 已按 rank 排序，追加后每格仍有序
+            table = [()] * (1 << width)
+            for i in ids:
+                _, val, mask = self.patterns[i]
+                # 编码不固定的抽取位两种取值都要放
+                free = _extract(~mask & bits, runs)
+                base = _extract(val & mask, runs)
+                sub = free
+                while True:
+                    table[base | sub] += ((val, mask, i),)
+                    if not sub:
+                        break
+                    sub = (sub - 1) & free
+            self.groups[opcode] = (bits, runs, table)
+        self._scalar_groups = {opcode: (_extractor(runs), table)
+                               for opcode, (_, runs, table) in self.groups.items()}
+        # decode_array 首次调用时由 self.groups 转换
+        self._array_groups = None
+
+    @classmethod
+    def from_fcov(cls, fcov_file, **kwargs):
+        return cls(load_fcov_patterns(fcov_file), **kwargs)
+
+    def decode_id(self, word):
+        """返回指令 id，未知指令返回 None"""
+        group = self._scalar_groups.get(word & OPCODE_MASK)
+        if group is None:
+            chain = self.other
+        else:
+            chain = group[1][group[0](word)]
+        for val, mask, i in chain:
+            if word & mask == val:
+                return i
+        return None
+
+    def decode(self, word):
+        """返回指令名，未知指令返回 None"""
+        i = self.decode_id(word)
+        return None if i is None else self.names[i]
+
+    def decode_all(self, words):
+        """逐个译码，返回指令名列表"""
+        decode_id, names = self.decode_id, self.names
+        result = []
+        for word in words:
+            i = decode_id(word)
+            result.append(None if i is None else names[i])
+        return result
+
+    def stats(self):
+        """各组的区分位与表的情况：[{"opcode", "bits", "table_size", "patterns", "max_chain"}, ...]"""
+        result = []
+        for opcode, (bits, _, table) in self.groups.items():
+            result.append({
+                "opcode": f"{opcode:07b}",
+                "bits": [b for b in range(31, -1, -1) if bits >> b & 1],
+                "table_size": len(table),
+                "patterns": len({t[2] for slot in table for t in slot}),
+                "max_chain": max(len(slot) for slot in table),
+            })
+        return result
+
+    def _compile_arrays(self):
+        """每组的平坦表转成 (抽取段, vals, masks, ids)，形状为 (最长链, 表长)，空位 id 为 UNKNOWN_ID"""
+        import numpy as np
+
+        groups = {}
+        for opcode, (_, runs, table) in self.groups.items():
+            depth = max(len(slot) for slot in table)
+            vals = np.zeros((depth, len(table)), dtype=np.uint32)
+            masks = np.zeros((depth, len(table)), dtype=np.uint32)
+            ids = np.full((depth, len(table)), UNKNOWN_ID, dtype=np.int32)
+            for index, slot in enumerate(table):
+                for k, (val, mask, i) in enumerate(slot):
+                    vals[k, index], masks[k, index], ids[k, index] = val, mask, i
+            groups[opcode] = (runs, vals, masks, ids)
+        other = (np.array([t[0] for t in self.other], dtype=np.uint32),
+                 np.array([t[1] for t in self.other], dtype=np.uint32),
+                 np.array([t[2] for t in self.other], dtype=np.int32))
+        return groups, other
+
+    def _lookup_array(self, words):
+        import numpy as np
+
+        groups, (other_vals, other_masks, other_ids) = self._array_groups
+        ids = np.full(len(words), UNKNOWN_ID, dtype=np.int32)
+        opcodes = words & np.uint32(OPCODE_MASK)
+        grouped = np.zeros(len(words), dtype=bool)
+        for opcode, (runs, vals, masks, slot_ids) in groups.items():
+            sel = opcodes == opcode
+            grouped |= sel
+            w = words[sel]
+            index = np.zeros(len(w), dtype=np.intp)
+            for shift, mask, out in runs:
+                index |= ((w >> np.uint32(shift)) & np.uint32(mask)).astype(np.intp) << out
+            # 链按 rank 排序，倒序赋值使靠前的编码最后写入
+            found = np.full(len(w), UNKNOWN_ID, dtype=np.int32)
+            for k in range(len(vals) - 1, -1, -1):
+                ok = (w & masks[k][index]) == vals[k][index]
+                found[ok] = slot_ids[k][index][ok]
+            ids[sel] = found
+        if len(other_ids):
+            rest = np.flatnonzero(~grouped)
+            w = words[rest]
+            found = np.full(len(w), UNKNOWN_ID, dtype=np.int32)
+            for k in range(len(other_ids) - 1, -1, -1):
+                found[(w & other_masks[k]) == other_vals[k]] = other_ids[k]
+            ids[rest] = found
+        return ids
+
+    def iter_decode_array(self, words, chunk_words=DECODE_CHUNK_WORDS):
+        """同 InstDecoder.iter_decode_array；需要 numpy"""
+        import numpy as np
+        if self._array_groups is None:
+            self._array_groups = self._compile_arrays()
+        words = np.asarray(words, dtype=np.uint32)
+        for start in range(0, len(words), chunk_words):
+            yield start, self._lookup_array(words[start:start + chunk_words])
+
+    def decode_array(self, words, chunk_words=DECODE_CHUNK_WORDS):
+        """同 InstDecoder.decode_array"""
+        import numpy as np
+        ids = np.empty(len(words), dtype=np.int32)
+        for start, chunk in self.iter_decode_array(words, chunk_words):
+            ids[start:start + len(chunk)] = chunk
+        return ids# }}}
+
+if __name__ == "__main__":
+    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(description="按 fcov 中的 wildcard 编码译码 32 位指令字")
+    parser.add_argument("fcov_file", help="all_v_inst_fcov.sv")
+    parser.add_argument("words", nargs="*",
+                        help="十六进制指令字；不给出时从标准输入逐行读取")
+    parser.add_argument("--emit", metavar="OUT_PY", help="写出独立的 Python 译码模块")
+    parser.add_argument("--direct", action="store_true",
+                        help="用 DirectDecoder（区分位直接查表）译码，并打印各 opcode 的区分位")
+    # 允许选项写在指令字之后，如 fcov 00000057 --direct
+    args = parser.parse_intermixed_args()
+
+    if args.direct and args.emit:
+        parser.error("--emit is only supported by the decision-tree decoder")
+    if args.direct:
+        dec = DirectDecoder.from_fcov(args.fcov_file)
+        for st in dec.stats():
+            print(f"opcode {st['opcode']}: {st['patterns']} patterns, "
+                  f"bits {st['bits']}, table {st['table_size']}, max chain {st['max_chain']}")
+    else:
+        dec = InstDecoder.from_fcov(args.fcov_file)
+    if args.emit:
+        dec.emit_python(args.emit)
+    if args.words or not (args.emit or sys.stdin.isatty()):
+        for text in args.words or sys.stdin:
+            text = text.strip()
+            if text:
+                name = dec.decode(int(text, 16))
+                print(f"{text}  {name or 'unknown'}")
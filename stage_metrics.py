@@ -0,0 +1,121 @@
+# coding: utf-8
+"""
+Per-stage metrics shared by detect_encoding_conflicts.py and
+gen_v_inst_code/gen_v_inst.py (--metrics). Code under measurement wraps its
+stages in stage(), which is a no-op until start() is called:
+    from stage_metrics import stage as _stage
+    with _stage("encode") as st:
+        ...
+        st["rows"] += n
+"""
+import contextlib
+import json
+import sys
+import threading
+import time
+
+
+class Metrics:
+    """
+    Per-stage counters: calls, wall / CPU seconds, tracemalloc peak and rows,
+    accumulated over every entry of a stage.
+    peak_mem_bytes is the absolute traced peak inside the stage (not a delta);
+    nested stages fold their peak into the enclosing ones. CPU time is per
+    thread (time.thread_time). Stages run in other threads (e.g. background
+    table writers) do not reset the tracemalloc peak and record
+    peak_mem_bytes as None. With trace_memory=False tracemalloc is not
+    started (for throughput runs; look at max_rss_kb for the peak).
+    """
+    def __init__(self, trace_memory=True):
+        import tracemalloc
+        self._tracemalloc = tracemalloc if trace_memory else None
+        self.stages = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # per-job reports of a batch run, filled in by the caller
+        self.jobs = []
+        self._wall0 = time.perf_counter()
+        self._cpu0 = time.process_time()
+        if trace_memory:
+            tracemalloc.start()
+
+    def stop(self):
+        if self._tracemalloc:
+            self._tracemalloc.stop()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        tm = self._tracemalloc
+        track_peak = tm is not None and threading.current_thread() is threading.main_thread()
+        stack = self._local.__dict__.setdefault("stack", [])
+        if track_peak:
+            # credit the peak so far to the enclosing stages before resetting it
+            peak = tm.get_traced_memory()[1]
+            for frame in stack:
+                frame["peak"] = max(frame["peak"], peak)
+            tm.reset_peak()
+        frame = {"peak": 0, "rows": 0}
+        stack.append(frame)
+        wall0, cpu0 = time.perf_counter(), time.thread_time()
+        try:
+            yield frame
+        finally:
+            wall, cpu = time.perf_counter() - wall0, time.thread_time() - cpu0
+            stack.pop()
+            peak = max(frame["peak"], tm.get_traced_memory()[1]) if track_peak else None
+            with self._lock:
+                st = self.stages.setdefault(name, {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                                                   "peak_mem_bytes": None, "rows": 0})
+                st["calls"] += 1
+                st["wall_s"] += wall
+                st["cpu_s"] += cpu
+                st["rows"] += frame["rows"]
+                if peak is not None:
+                    st["peak_mem_bytes"] = max(st["peak_mem_bytes"] or 0, peak)
+
+    def report(self):
+        import resource
+        report = {
+            "argv": sys.argv,
+            "wall_s": time.perf_counter() - self._wall0,
+            "cpu_s": time.process_time() - self._cpu0,
+            "peak_traced_bytes": self._tracemalloc.get_traced_memory()[1] if self._tracemalloc else None,
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "stages": [dict(name=k, **v) for k, v in self.stages.items()],
+        }
+        if self.jobs:
+            report["jobs"] = self.jobs
+        return report
+
+    def save(self, output_file):
+        with open(output_file, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+
+# set by start(); None keeps stage() a no-op
+METRICS = None
+
+
+def start(trace_memory=True):
+    """Start collecting (replacing any previous Metrics) and return the new Metrics."""
+    global METRICS
+    stop()
+    METRICS = Metrics(trace_memory)
+    return METRICS
+
+
+def stop():
+    """
+    Stop collecting. Also used as the initializer of worker processes:
+    forked workers inherit METRICS, and drop it so they run untraced.
+    """
+    global METRICS
+    if METRICS is not None:
+        METRICS.stop()
+        METRICS = None
+
+
+def stage(name):
+    if METRICS is None:
+        return contextlib.nullcontext({"rows": 0})
+    return METRICS.stage(name)